@@ -0,0 +1,213 @@
+# docker-compose exec app python3 bench.py -e connect4 sushigo -g 200
+
+import os
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import argparse
+import json
+import random
+import subprocess
+import time
+import numpy as np
+
+from stable_baselines import logger
+
+from utils.register import ENVIRONMENTS, get_environment
+
+import config
+
+
+def random_legal_action(env):
+  return np.random.choice(np.flatnonzero(env.legal_actions))
+
+
+def timed(fn):
+  start = time.perf_counter()
+  out = fn()
+  return out, time.perf_counter() - start
+
+
+def per_second(count, seconds):
+  return count / seconds if seconds > 0 else None
+
+
+def bench_env(env, games):
+  # play random legal games, timing each part of the loop separately
+  totals = {'reset': 0.0, 'step': 0.0, 'observation': 0.0, 'legal_actions': 0.0, 'rules_move': 0.0}
+  steps = 0
+  rules_calls = 0
+  rules_error = None
+
+  for _ in range(games):
+    _, t = timed(env.reset)
+    totals['reset'] += t
+    done = False
+
+    while not done:
+      _, t = timed(lambda: env.observation)
+      totals['observation'] += t
+      _, t = timed(lambda: env.legal_actions)
+      totals['legal_actions'] += t
+
+      if rules_error is None:
+        try:
+          _, t = timed(env.rules_move)
+          totals['rules_move'] += t
+          rules_calls += 1
+        except Exception as e:
+          rules_error = str(e)
+
+      action = random_legal_action(env)
+      (_, _, done, _), t = timed(lambda: env.step(action))
+      totals['step'] += t
+      steps += 1
+
+  return {
+    'games': games,
+    'steps': steps,
+    'resets_per_second': per_second(games, totals['reset']),
+    'steps_per_second': per_second(steps, totals['step']),
+    'observation_us': 1e6 * totals['observation'] / steps if steps > 0 else None,
+    'legal_actions_us': 1e6 * totals['legal_actions'] / steps if steps > 0 else None,
+    'rules_move_us': 1e6 * totals['rules_move'] / rules_calls if rules_calls > 0 else None,
+    'rules_move_error': rules_error,
+  }
+
+
+def bench_selfplay(env, games):
+  # SelfPlayEnv.step includes every opponent move until it is the agent's turn again
+  step_time = 0.0
+  steps = 0
+
+  for _ in range(games):
+    env.reset()
+    done = False
+    while not done:
+      action = random_legal_action(env)
+      (_, _, done, _), t = timed(lambda: env.step(action))
+      step_time += t
+      steps += 1
+
+  return {
+    'games': games,
+    'steps': steps,
+    'opponent_type': env.opponent_type,
+    'steps_per_second': per_second(steps, step_time),
+  }
+
+
+def bench_selfplay_vec(env, games):
+  # SelfPlayVecEnv.step plays every game's opponent moves, batching those that use the same model
+  step_time = 0.0
+  steps = 0
+  finished = 0
+
+  if games > 0:
+    env.reset()
+  while finished < games:
+    actions = [random_legal_action(e) for e in env.envs]
+    (_, _, dones, _), t = timed(lambda: env.step(actions))
+    step_time += t
+    steps += env.n_envs
+    finished += int(np.sum(dones))
+
+  return {
+    'games': finished,
+    'steps': steps,
+    'n_envs': env.n_envs,
+    'opponent_type': env.envs[0].opponent_type,
+    'steps_per_second': per_second(steps, step_time),
+  }
+
+
+def get_commit():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr = subprocess.DEVNULL).decode().strip()
+  except Exception:
+    return None
+
+
+def main(args):
+
+  logger.configure(config.LOGDIR)
+  logger.set_level(config.INFO)
+
+  random.seed(args.seed)
+  np.random.seed(args.seed)
+
+  results = {}
+  for env_name in args.env_names:
+    try:
+      base_env = get_environment(env_name)
+    except Exception as e:
+      logger.info(f'Skipping {env_name}: {e}')
+      continue
+
+    logger.info(f'\nBenchmarking {env_name}...')
+    env = base_env(verbose = False)
+    env.seed(args.seed)
+    results[env_name] = {'env': bench_env(env, args.games)}
+
+    if args.selfplay:
+      from utils.selfplay import selfplay_wrapper, SelfPlayVecEnv
+      if args.n_envs > 1:
+        selfplay_env = SelfPlayVecEnv(base_env, args.n_envs, opponent_type = args.opponent_type, verbose = False)
+        for i, e in enumerate(selfplay_env.envs):
+          e.seed(args.seed + i)
+        results[env_name]['selfplay'] = bench_selfplay_vec(selfplay_env, args.selfplay_games)
+      else:
+        selfplay_env = selfplay_wrapper(base_env)(opponent_type = args.opponent_type, verbose = False)
+        selfplay_env.seed(args.seed)
+        results[env_name]['selfplay'] = bench_selfplay(selfplay_env, args.selfplay_games)
+
+    logger.info(json.dumps(results[env_name], indent = 2))
+
+  out = {
+    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'commit': get_commit(),
+    'seed': args.seed,
+    'results': results,
+  }
+
+  with open(args.output, 'w') as f:
+    json.dump(out, f, indent = 2)
+
+  logger.info(f'\nResults written to {args.output}')
+
+
+def cli() -> None:
+  """Handles argument extraction from CLI and passing to main().
+  Note that a separate function is used rather than in __name__ == '__main__'
+  to allow unit testing of cli().
+  """
+  # Setup argparse to show defaults on help
+  formatter_class = argparse.ArgumentDefaultsHelpFormatter
+  parser = argparse.ArgumentParser(formatter_class=formatter_class)
+
+  parser.add_argument("--env_names", "-e", nargs = '+', type = str, default = ENVIRONMENTS
+            , help="Which environments to benchmark")
+  parser.add_argument("--games", "-g", type = int, default = 100
+            , help="How many random games to play per environment")
+  parser.add_argument("--selfplay", "-sp", action = 'store_true', default = False
+            , help="Also time SelfPlayEnv.step, including opponent inference (needs the zoo)")
+  parser.add_argument("--selfplay_games", "-sg", type = int, default = 10
+            , help="How many selfplay games to play per environment")
+  parser.add_argument("--n_envs", "-ne", type = int, default = 1
+            , help="Time n_envs selfplay games stepped together by SelfPlayVecEnv, with batched opponent inference")
+  parser.add_argument("--opponent_type", "-o", type = str, default = 'base'
+            , help="best / mostly_best / random / base / rules - the opponent used in selfplay timings")
+  parser.add_argument("--output", "-out", type = str, default = config.BENCHPATH
+            , help="Where to write the JSON results")
+  parser.add_argument("--seed", "-s",  type = int, default = 17
+            , help="Random seed")
+
+  # Extract args
+  args = parser.parse_args()
+
+  # Enter main
+  main(args)
+  return
+
+
+if __name__ == '__main__':
+  cli()
@@ -7,5 +7,13 @@ DISABLED = 50
 
 LOGDIR = "logs"
 RESULTSPATH = 'viz/results.csv'
+BENCHPATH = 'logs/bench.json'
 TMPMODELDIR = "zoo/tmp"
 MODELDIR = "zoo"
+
+MAX_LOADED_OPPONENTS = 10
+MAX_QUEUED_LOADS = 4
+
+INITIAL_RATING = 1000
+RATING_K = 32
+RATING_TEMPERATURE = 200
@@ -9,20 +9,29 @@ from stable_baselines import logger
 
 from .classes import *
 
+OPPOSITE = {'U': 'D', 'D': 'U', 'L': 'R', 'R': 'L'}
+
+# layout of the compact observation: the 0/1 entries bit-packed, then one byte per score (score + SCORE_OFFSET)
+# models/butterfly/models.py and utils/runtime.py unpack it with these
+SCORES_START = 5353
+PLAYERS = 3
+MAX_SCORE = 100
+SCORE_OFFSET = 128
+
 class ButterflyEnv(gym.Env):
     metadata = {'render.modes': ['human']}
 
-    def __init__(self, verbose = False):
+    def __init__(self, verbose = False, compact = False):
         super(ButterflyEnv, self).__init__()
         self.name = 'butterfly'
-        self.n_players = 3
+        self.n_players = PLAYERS
 
         self.board_size = 7
         self.squares = self.board_size * self.board_size
 
         self.tile_types = 11
         
-        self.max_score = 100
+        self.max_score = MAX_SCORE
         
         self.total_positions = self.squares + self.n_players + 1
 
@@ -31,8 +40,41 @@ class ButterflyEnv(gym.Env):
         self.total_tiles = sum([x['count'] for x in self.contents])
 
         self.action_space = gym.spaces.Discrete(self.total_tiles  * 2)
-        self.observation_space = gym.spaces.Box(0, 1, (self.total_positions * self.total_tiles + self.squares + 4 + self.n_players + self.action_space.n ,))
+        self.observation_size = self.total_positions * self.total_tiles + self.squares + 4 + self.n_players + self.action_space.n
+        self.observation_space = gym.spaces.Box(0, 1, (self.observation_size, ), dtype=np.float32)
         self.verbose = verbose
+        self.legal_actions_key = None
+
+        self.hudson_start = self.total_positions * self.total_tiles
+        self.scores_start = self.hudson_start + self.squares + 4
+        self.legal_actions_start = self.scores_start + self.n_players
+
+        # compact observations bit-pack the 0/1 entries and store each score as a byte, to be expanded inside the policy
+        self.compact = compact
+        if self.compact:
+            n_bytes = (self.observation_size - self.n_players + 7) // 8
+            self.observation_space = gym.spaces.Box(0, 255, (n_bytes + self.n_players, ), dtype=np.uint8)
+            # the 0/1 entries are written straight into bits, with the legal actions right after Hudson
+            self.bits = np.zeros(n_bytes * 8, dtype=np.uint8)
+        else:
+            # one buffer per seat, refilled in place each time that seat's observation is read
+            self.observations = np.zeros((self.n_players, self.observation_size), dtype=np.float32)
+            self.observation_views = []
+            for player_num in range(self.n_players):
+                view = self.observations[player_num].view()
+                view.flags.writeable = False
+                self.observation_views.append(view)
+
+        # rays[square][direction] is every square from square to the edge of the board, nearest first
+        self.rays = []
+        for square in range(self.squares):
+            row, col = divmod(square, self.board_size)
+            self.rays.append({
+                'U': tuple(square - i * self.board_size for i in range(1, row + 1)),
+                'D': tuple(square + i * self.board_size for i in range(1, self.board_size - row)),
+                'L': tuple(square - i for i in range(1, col + 1)),
+                'R': tuple(square + i for i in range(1, self.board_size - col)),
+            })
 
 
     def set_contents(self):
@@ -63,125 +105,95 @@ class ButterflyEnv(gym.Env):
             self.contents.append({'tile': Wasp, 'info': {'name': 'wasp', 'value': value}, 'count':  1})
 
         
-    @property
-    def observation(self):
-        obs = np.zeros(([self.total_positions, self.total_tiles]))
+    def fill_observation(self, out, legal_actions_start):
+        # sets the 0/1 entries of the observation in out, which starts with the tile and Hudson planes
+        obs = out[:self.hudson_start].reshape(self.total_positions, self.total_tiles)
         player_num = self.current_player_num
 
-        # print('Tiles')
+        # Tiles
         for s, tile in enumerate(self.board.tiles):
             if tile is not None:
                 obs[s][tile.id] = 1
-                # print(s, tile.id)
 
-        # print('Positions')
+        # Positions
         for i in range(self.n_players):
             player = self.players[player_num]
 
             for tile in player.position.tiles:
                 obs[self.squares + i][tile.id] = 1
-                # print(self.squares + i, tile.id)
 
             player_num = (player_num + 1) % self.n_players
         
-        # print('DrawBag')
+        # DrawBag
         for tile in self.drawbag.tiles:
             obs[-1][tile.id] = 1
-            # print(len(obs)-1, tile.id)
-
-        ret = obs.flatten()
 
-        # print('Hudson')
-        hudson_obs = np.zeros((self.squares, ))
-        hudson_obs[self.board.hudson] = 1
-        # print(len(ret) + self.board.hudson)
+        # Hudson and the way he is facing
+        out[self.hudson_start + self.board.hudson] = 1
+        out[self.hudson_start + self.squares + ['U','D','L','R'].index(self.board.hudson_facing)] = 1
 
-        ret = np.append(ret, hudson_obs)
-
-        # print('Hudson facing')
-        hudson_facing_obs = np.zeros((4, ))
-        for i, x in enumerate(['U','D','L','R']):
-            if self.board.hudson_facing == x:
-                hudson_facing_obs[i] = 1
-                # print(len(ret) + i)
-
-        ret = np.append(ret, hudson_facing_obs)
-
-        # print('Score')
-        score_obs = np.zeros((self.n_players, ))
+        # Legal actions
+        out[legal_actions_start:legal_actions_start + self.action_space.n] = self.legal_actions
 
+    @property
+    def scores(self):
+        # scores from the current player's point of view
         player_num = self.current_player_num
+        scores = []
         for i in range(self.n_players):
-            player = self.players[player_num]
-            score_obs[i] = player.position.score / self.max_score
-            # print(len(ret) + i)
-            # print(score_obs[i])
+            scores.append(self.players[player_num].position.score)
             player_num = (player_num + 1) % self.n_players
+        return scores
 
-        ret = np.append(ret, score_obs)
-
-        # print('Legal actions')
-        # for i in range(len(self.legal_actions)):
-        #     if self.legal_actions[i] == 1:
-        #         print(len(ret) + i)
+    @property
+    def observation(self):
+        if self.compact:
+            return self.compact_observation()
 
-        ret = np.append(ret, self.legal_actions)
+        obs = self.observations[self.current_player_num]
+        obs[:] = 0
+        self.fill_observation(obs, self.legal_actions_start)
+        obs[self.scores_start:self.legal_actions_start] = np.array(self.scores) / self.max_score
+        return self.observation_views[self.current_player_num]
 
-        return ret
+    def compact_observation(self):
+        self.bits[:] = 0
+        self.fill_observation(self.bits, self.scores_start)
+        scores = [min(max(score + SCORE_OFFSET, 0), 255) for score in self.scores]
+        return np.concatenate([np.packbits(self.bits), np.array(scores, dtype=np.uint8)])
 
     @property
     def legal_actions(self):
+        # only recomputed when the board (tiles, nets or Hudson) has changed
+        if self.legal_actions_key != self.board.version:
+            self.legal_actions_cache = self.get_legal_actions()
+            self.legal_actions_cache.flags.writeable = False
+            self.legal_actions_key = self.board.version
+        return self.legal_actions_cache
+
+    def get_legal_actions(self):
         legal_actions = np.zeros(self.action_space.n)
-
-        # UP / DOWN
-        for factor in [-1,1]:
-            if (factor == -1 and self.board.hudson_facing == 'D') or (factor == 1 and self.board.hudson_facing == 'U'):
-                pass
-            else:
-                current_square = self.board.hudson
-                found_net = False
-                for i in range(self.board_size):
-                    current_square = current_square + factor * self.board_size
-                    if 0 <= current_square < self.squares:
-                        tile = self.board.tiles[current_square]
-                        if tile is not None:
-                            legal_actions[tile.id] = 1
-                            if found_net:
-                                legal_actions[tile.id + self.total_tiles] = 1
-                        else:
-                            if self.board.nets[current_square] == 1:
-                                found_net = True
-                    else:
-                        break
-
-        # LEFT / RIGHT
-        for factor in [-1,1]:
-            if (factor == -1 and self.board.hudson_facing == 'R') or (factor == 1 and self.board.hudson_facing == 'L'):
-                pass
-            else:
-                current_square = self.board.hudson
-                found_net = False
-                for i in range(self.board_size):
-                    current_square = current_square + factor
-                    if (factor == 1 and current_square % self.board_size != 0) or (factor == -1 and current_square % self.board_size != self.board_size - 1) :
-                        tile = self.board.tiles[current_square]
-                        if tile is not None:
-                            legal_actions[tile.id] = 1
-                            if found_net:
-                                legal_actions[tile.id + self.total_tiles] = 1
-                        else:
-                            if self.board.nets[current_square] == 1:
-                                found_net = True
-                    else:
-                        break
-
+        tiles = self.board.tiles
+        nets = self.board.nets
+
+        # Hudson can look any way except back the way he came
+        for direction, ray in self.rays[self.board.hudson].items():
+            if direction == OPPOSITE[self.board.hudson_facing]:
+                continue
+
+            found_net = False
+            for square in ray:
+                tile = tiles[square]
+                if tile is not None:
+                    legal_actions[tile.id] = 1
+                    if found_net:
+                        legal_actions[tile.id + self.total_tiles] = 1
+                elif nets[square]:
+                    found_net = True
 
         return legal_actions
 
 
-
-
-
     def score_game(self):
         reward = [0.0] * self.n_players
         scores = [p.position.score for p in self.players]
@@ -215,7 +227,7 @@ class ButterflyEnv(gym.Env):
             net = True        
             tile_id = tile_id - self.total_tiles
 
-        square = [i for i, tile in enumerate(self.board.tiles) if tile is not None and tile.id == tile_id][0]
+        square = self.board.tile_squares[tile_id]
 
         return net, square
 
@@ -378,5 +390,27 @@ class ButterflyEnv(gym.Env):
             logger.debug(f'Player {p.id} points: {p.position.score}')
 
 
+    def rules_value(self, action):
+        net, square = self.convert_action(action)
+        tile = self.board.tiles[square]
+        position = self.current_player.position
+
+        if net and self.drawbag.size() > 0:
+            # the net tile is drawn blind, so take the average over what is left in the drawbag
+            return np.mean([position.score_delta([tile, extra]) for extra in self.drawbag.tiles])
+
+        return position.score_delta([tile])
+
     def rules_move(self):
-        raise Exception('Rules based agent is not yet implemented for Butterfly!')
+        WRONG_MOVE_PROB = 0.01
+        legal_actions = self.legal_actions
+        actions = np.flatnonzero(legal_actions)
+
+        values = np.array([self.rules_value(action) for action in actions])
+        best_actions = actions[values == values.max()]
+        if logger.get_level() <= config.DEBUG:
+            logger.debug(f'Rules values: {dict(zip(actions, values.round(2)))}')
+
+        action_probs = WRONG_MOVE_PROB * legal_actions
+        action_probs[best_actions] = (1 - WRONG_MOVE_PROB * (len(actions) - len(best_actions))) / len(best_actions)
+        return action_probs
@@ -1,4 +1,8 @@
 import random
+import itertools
+
+# every change to any board takes a new number, so (board, version) pairs never repeat
+VERSIONS = itertools.count()
 
 class Player():
     def __init__(self, id):
@@ -119,61 +123,125 @@ class DrawBag():
   
 
 
+BUTTERFLY_COLOURS = ['R','B','G','Y']
+
+CATEGORIES = [f'{colour}butterfly' for colour in BUTTERFLY_COLOURS] + ['flower', 'dragonfly', 'lightningbug', 'cricket', 'hive', 'wasp']
+
+
+def category(tile):
+    # bees and honeycombs cancel each other out, so they are scored together
+    if tile.type in ('bee', 'honeycomb'):
+        return 'hive'
+    return tile.type
+
+
 class Position():
     def __init__(self):
         self.tiles = []  
+        # running totals for each scoring category, so scoring never rescans the tiles
+        self.butterflies = {colour: 0 for colour in BUTTERFLY_COLOURS}
+        self.butterfly_x = {colour: False for colour in BUTTERFLY_COLOURS}
+        self.flowers = 0
+        self.dragonfly = None
+        self.lightningbug = None
+        self.cricket = None
+        self.bees = []
+        self.honeycomb = []
+        self.hive = 0
+        self.wasps = 0
     
     def add(self, tiles):
         for tile in tiles:
             self.tiles.append(tile)
+
+            if tile.type.endswith('butterfly'):
+                self.butterflies[tile.colour] += tile.value
+                if tile.value == 0:
+                    self.butterfly_x[tile.colour] = True
+            elif tile.type == 'flower':
+                self.flowers += 1
+            elif tile.type == 'dragonfly':
+                self.dragonfly = tile.value if self.dragonfly is None else max(self.dragonfly, tile.value)
+            elif tile.type == 'lightningbug':
+                self.lightningbug = tile.value if self.lightningbug is None else min(self.lightningbug, tile.value)
+            elif tile.type == 'cricket':
+                self.cricket = tile.value
+            elif tile.type in ('bee', 'honeycomb'):
+                self.add_to_hive(tile)
+            elif tile.type == 'wasp':
+                self.wasps += tile.value
     
+    def add_to_hive(self, tile):
+        # each bee is cancelled by one honeycomb, best honeycombs first, so only the change is added
+        n_bees, n_honeycomb = len(self.bees), len(self.honeycomb)
+        if tile.type == 'bee':
+            self.hive += self.honeycomb[n_bees] if n_bees < n_honeycomb else tile.value
+            self.bees.append(tile.value)
+        else:
+            rank = len([v for v in self.honeycomb if v >= tile.value])
+            if n_bees > n_honeycomb:
+                # takes the place of the first bee that had no honeycomb
+                self.hive += tile.value - self.bees[n_honeycomb]
+            elif rank < n_bees:
+                # pushes the lowest matched honeycomb out
+                self.hive += tile.value - self.honeycomb[n_bees - 1]
+            self.honeycomb.insert(rank, tile.value)
+
     def size(self):
         return len(self.tiles)
 
-    @property
-    def score(self):
-        score = 0
-        #BUTTERFLIES
-        for colour in ['R','B','G','Y']:
-            tile_values = [t.value for t in self.tiles if t.type == f'{colour}butterfly']
-            s = sum(tile_values)
-            if 0 in tile_values:
+    def category_score(self, name, tiles = ()):
+        # the score from one category, as if tiles (all in that category) had also been added
+        if name == 'flower':
+            return pow(self.flowers + len(tiles), 2)
+
+        if name == 'hive':
+            if len(tiles) == 0:
+                return self.hive
+            bees = self.bees + [t.value for t in tiles if t.type == 'bee']
+            honeycomb = sorted(self.honeycomb + [t.value for t in tiles if t.type == 'honeycomb'], reverse = True)
+            return sum(honeycomb[:len(bees)]) + sum(bees[len(honeycomb):])
+
+        values = [t.value for t in tiles]
+
+        if name.endswith('butterfly'):
+            colour = name[0]
+            s = self.butterflies[colour] + sum(values)
+            if self.butterfly_x[colour] or 0 in values:
                 s *= 2
-            
-            score += s
-        
-        #FLOWERS
-        count = len([t for t in self.tiles if t.type == f'flower'])
-        score += pow(count, 2)
+            return s
 
-        #DRAGONFLY
-        drag = [t.value for t in self.tiles if t.type == f'dragonfly']
-        if len(drag) > 0:
-            score += max(drag)
+        if name == 'dragonfly':
+            values += [] if self.dragonfly is None else [self.dragonfly]
+            return max(values) if len(values) > 0 else 0
 
-        #LIGHTNINGBUG
-        lb = [t.value for t in self.tiles if t.type == f'lightningbug']
-        if len(lb) > 0:
-            score += min(lb)
+        if name == 'lightningbug':
+            values += [] if self.lightningbug is None else [self.lightningbug]
+            return min(values) if len(values) > 0 else 0
 
-        #CRICKET
-        cricket = [t.value for t in self.tiles if t.type == f'cricket']
-        if len(cricket) > 0:
-            score += cricket[-1]
+        if name == 'cricket':
+            if len(values) > 0:
+                return values[-1]
+            return 0 if self.cricket is None else self.cricket
 
-        #BEE / HONEYCOMB
-        bees = [t.value for t in self.tiles if t.type == f'bee']
-        honeycomb = sorted([t.value for t in self.tiles if t.type == f'honeycomb'], reverse = True)
+        if name == 'wasp':
+            return self.wasps + sum(values)
 
-        score += sum(honeycomb[:len(bees)])
-        score += sum(bees[len(honeycomb):])
+    @property
+    def score(self):
+        return sum(self.category_score(name) for name in CATEGORIES)
 
-        #WASP
-        score += sum([t.value for t in self.tiles if t.type == f'wasp'])
+    def score_delta(self, tiles):
+        # the change in score from adding tiles, only rescoring the categories they belong to
+        added = {}
+        for tile in tiles:
+            added.setdefault(category(tile), []).append(tile)
 
+        delta = 0
+        for name, new_tiles in added.items():
+            delta += self.category_score(name, new_tiles) - self.category_score(name)
+        return delta
 
-        return score
-        
 
 
 class Board():
@@ -181,19 +249,45 @@ class Board():
         self.size = size
         self.squares = size * size
         self.tiles = [None] * self.squares 
+        self.tile_squares = {}
         self.nets = [False] * self.squares 
-        self.hudson = 0
-        self.hudson_facing = 'R'
+        self._hudson = 0
+        self._hudson_facing = 'R'
+        self.version = next(VERSIONS)
+
+    @property
+    def hudson(self):
+        return self._hudson
+
+    @hudson.setter
+    def hudson(self, square):
+        self._hudson = square
+        self.version = next(VERSIONS)
+
+    @property
+    def hudson_facing(self):
+        return self._hudson_facing
+
+    @hudson_facing.setter
+    def hudson_facing(self, facing):
+        self._hudson_facing = facing
+        self.version = next(VERSIONS)
     
     def add_net(self, position):
         self.nets[position] = True
+        self.version = next(VERSIONS)
     
     def remove(self, position):
         tile = self.tiles[position]
         self.tiles[position] = None
+        if tile is not None:
+            del self.tile_squares[tile.id]
+        self.version = next(VERSIONS)
         return tile
 
     def fill(self, tiles):
         self.tiles = tiles
+        self.tile_squares = {tile.id: square for square, tile in enumerate(tiles) if tile is not None}
+        self.version = next(VERSIONS)
 
 
@@ -1 +1,2 @@
-from connect4.envs.connect4 import Connect4Env
\ No newline at end of file
+from connect4.envs.connect4 import Connect4Env
+from connect4.envs.connect4_vec import Connect4VecEnv
@@ -0,0 +1,69 @@
+import numpy as np
+
+
+def square_bit(square, rows, cols):
+    # squares are numbered left to right, top to bottom
+    return (square % cols) * (rows + 1) + (rows - 1 - square // cols)
+
+
+class Bitboard():
+    # Each column is stored as rows + 1 bits (the extra bit is a sentinel that stops
+    # shifted lines wrapping into the next column). Bit 0 of a column is the bottom row.
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.height = rows + 1
+
+        self.bottom = sum(1 << (col * self.height) for col in range(cols))
+        self.full = self.bottom * ((1 << rows) - 1)
+
+        self.square_bits = np.array([square_bit(square, rows, cols) for square in range(rows * cols)])
+        self.reset()
+
+    def reset(self):
+        self.masks = [0, 0]
+        self.heights = [0] * self.cols
+
+    @property
+    def occupied(self):
+        return self.masks[0] | self.masks[1]
+
+    @property
+    def placeable(self):
+        return (self.occupied + self.bottom) & self.full
+
+    def is_legal(self, col):
+        return self.heights[col] < self.rows
+
+    def next_bit(self, col):
+        return 1 << (col * self.height + self.heights[col])
+
+    def next_square(self, col):
+        return (self.rows - 1 - self.heights[col]) * self.cols + col
+
+    def play(self, player, col):
+        square = self.next_square(col)
+        self.masks[player] |= self.next_bit(col)
+        self.heights[col] += 1
+        return square
+
+    def is_win(self, mask):
+        for shift in (1, self.height, self.height - 1, self.height + 1):
+            pairs = mask & (mask >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
+
+    def unpack(self, *masks):
+        # returns one (rows, cols) plane of 0/1 per mask, stacked on the last axis
+        raw = np.frombuffer(b''.join(m.to_bytes(8, 'little') for m in masks), dtype=np.uint8)
+        bits = np.unpackbits(raw.reshape(len(masks), 8), axis = 1, bitorder = 'little')
+        return bits[:, self.square_bits].T.reshape(self.rows, self.cols, len(masks))
+
+    def player_at(self, square):
+        bit = 1 << int(self.square_bits[square])
+        if self.masks[0] & bit:
+            return 0
+        if self.masks[1] & bit:
+            return 1
+        return None
@@ -6,6 +6,10 @@ import config
 
 from stable_baselines import logger
 
+from .bitboard import Bitboard, square_bit
+
+ROWS = 6
+COLS = 7
 
 
 
@@ -27,29 +31,38 @@ class Connect4Env(gym.Env):
     def __init__(self, verbose = False):
         super(Connect4Env, self).__init__()
         self.name = 'connect4'
-        self.rows = 6
-        self.cols = 7
+        self.rows = ROWS
+        self.cols = COLS
         self.n_players = 2
         self.grid_shape = (self.rows, self.cols)
         self.num_squares = self.rows * self.cols
         self.action_space = gym.spaces.Discrete(self.cols)
-        self.observation_space = gym.spaces.Box(-1, 1, self.grid_shape + (3, ))
+        self.observation_space = gym.spaces.Box(-1, 1, self.grid_shape + (3, ), dtype=np.int8)
         self.verbose = verbose
+        self.board = Bitboard(self.rows, self.cols)
+
+        self.observations = np.zeros((self.n_players, ) + self.grid_shape + (3, ), dtype=self.observation_space.dtype)
+        self.observation_views = []
+        for player in range(self.n_players):
+            view = self.observations[player].view()
+            view.flags.writeable = False
+            self.observation_views.append(view)
         
 
     @property
     def observation(self):
-        if self.current_player.token.number == 1:
-            position_1 = np.array([1 if x.number == 1 else 0  for x in self.board]).reshape(self.grid_shape)
-            position_2 = np.array([1 if x.number == -1 else 0 for x in self.board]).reshape(self.grid_shape)
-            position_3 = np.array([self.can_be_placed(i) for i,x in enumerate(self.board)]).reshape(self.grid_shape)
-        else:
-            position_1 = np.array([1 if x.number == -1 else 0 for x in self.board]).reshape(self.grid_shape)
-            position_2 = np.array([1 if x.number == 1 else 0 for x in self.board]).reshape(self.grid_shape)
-            position_3 = np.array([self.can_be_placed(i) for i,x in enumerate(self.board)]).reshape(self.grid_shape)
+        # read-only view onto the current player's buffer, which is updated in place by step
+        return self.observation_views[self.current_player_num]
 
-        out = np.stack([position_1, position_2, position_3], axis = -1) 
-        return out
+    def update_observations(self, square):
+        player = self.current_player_num
+        row, col = divmod(square, self.cols)
+
+        self.observations[player, row, col, 0] = 1
+        self.observations[1 - player, row, col, 1] = 1
+        self.observations[:, row, col, 2] = 0
+        if row > 0:
+            self.observations[:, row - 1, col, 2] = 1
 
     @property
     def legal_actions(self):
@@ -62,38 +75,28 @@ class Connect4Env(gym.Env):
 
 
     def is_legal(self, action_num):
-        if self.board[action_num].number==0:
+        if self.board.is_legal(action_num):
             return 1
         else:
             return 0
 
-    def can_be_placed(self, square_num):
-        
-        if self.board[square_num].number==0:
-            for height in range(square_num + self.cols, self.num_squares , self.cols):
-                if self.board[height].number==0:
-                    return 0
-        else:
-            return 0
-
-        return 1
-
-
 
-    def square_is_player(self, board, square, player):
-        return board[square].number == self.players[player].token.number
-
-    def check_game_over(self, board = None , player = None):
-
-        if board is None:
-            board = self.board
+    def check_game_over(self, mask = None, player = None, square = None):
 
         if player is None:
             player = self.current_player_num
 
-        for x,y,z,a in WINNERS:
-            if self.square_is_player(board, x, player) and self.square_is_player(board, y, player) and self.square_is_player(board, z, player) and self.square_is_player(board, a, player):
-                return 1, True
+        if mask is None:
+            mask = self.board.masks[player]
+
+        if square is None:
+            win = self.board.is_win(mask)
+        else:
+            # only lines through the square just played can have been completed
+            win = any((mask & line) == line for line in SQUARE_WINNERS[square])
+
+        if win:
+            return 1, True
 
         if self.turns_taken == self.num_squares:
             logger.debug("Board full")
@@ -101,12 +104,6 @@ class Connect4Env(gym.Env):
 
         return 0, False #-0.01 here to encourage choosing the win?
 
-    def get_square(self, board, action):
-        for height in range(1, self.rows + 1):
-            square = self.num_squares - (height * self.cols) + action
-            if board[square].number == 0:
-                return square
-
     @property
     def current_player(self):
         return self.players[self.current_player_num]
@@ -116,18 +113,16 @@ class Connect4Env(gym.Env):
         reward = [0,0]
         
         # check move legality
-        board = self.board
-        
         if not self.is_legal(action): 
             done = True
             reward = [1,1]
             reward[self.current_player_num] = -1
         else:
-            square = self.get_square(board, action)
-            board[square] = self.current_player.token
+            square = self.board.play(self.current_player_num, action)
+            self.update_observations(square)
 
             self.turns_taken += 1
-            r, done = self.check_game_over()
+            r, done = self.check_game_over(square = square)
             reward = [-r,-r]
             reward[self.current_player_num] = r
 
@@ -139,7 +134,9 @@ class Connect4Env(gym.Env):
         return self.observation, reward, done, {}
 
     def reset(self):
-        self.board = [Token('.', 0)] * self.num_squares
+        self.board.reset()
+        for player in range(self.n_players):
+            self.observations[player] = self.board.unpack(0, 0, self.board.placeable)
         self.players = [Player('1', Token('X', 1)), Player('2', Token('O', -1))]
         self.current_player_num = 0
         self.turns_taken = 0
@@ -157,8 +154,13 @@ class Connect4Env(gym.Env):
         else:
             logger.debug(f"It is Player {self.current_player.id}'s turn to move")
         
+        symbols = []
+        for square in range(self.num_squares):
+            player = self.board.player_at(square)
+            symbols.append('.' if player is None else self.players[player].token.symbol)
+
         for i in range(0,self.num_squares,self.cols):
-            logger.debug(' '.join([x.symbol for x in self.board[i:(i+self.cols)]]))
+            logger.debug(' '.join(symbols[i:(i+self.cols)]))
 
         if self.verbose:
             logger.debug(f'\nObservation: \n{self.observation}')
@@ -174,10 +176,8 @@ class Connect4Env(gym.Env):
 
         for action in range(self.action_space.n):
             if self.is_legal(action):
-                new_board = self.board.copy()
-                square = self.get_square(new_board, action)
-                new_board[square] = self.players[player].token
-                _, done = self.check_game_over(new_board, player)
+                new_mask = self.board.masks[player] | self.board.next_bit(action)
+                _, done = self.check_game_over(new_mask, player, self.board.next_square(action))
                 if done:
                     action_probs = [WRONG_MOVE_PROB] * self.action_space.n
                     action_probs[action] = 1 - WRONG_MOVE_PROB * (self.action_space.n - 1)
@@ -187,18 +187,16 @@ class Connect4Env(gym.Env):
 
         for action in range(self.action_space.n):
             if self.is_legal(action):
-                new_board = self.board.copy()
-                square = self.get_square(new_board, action)
-                new_board[square] = self.players[player].token
-                _, done = self.check_game_over(new_board, player)
+                new_mask = self.board.masks[player] | self.board.next_bit(action)
+                _, done = self.check_game_over(new_mask, player, self.board.next_square(action))
                 if done:
                     action_probs = [0] * self.action_space.n
                     action_probs[action] = 1 - WRONG_MOVE_PROB * (self.action_space.n - 1)
                     return action_probs
 
         
-        action, masked_action_probs = self.sample_masked_action([1] * self.action_space.n)
-        return masked_action_probs
+        legal_actions = self.legal_actions
+        return list(legal_actions / np.sum(legal_actions))
 
 
 
@@ -276,4 +274,11 @@ WINNERS = [
 			[7,15,23,31],
 			[15,23,31,39],
 			[14,22,30,38],
-			]
\ No newline at end of file
+			]
+
+
+# the bitboard masks of the winning lines through each square
+SQUARE_WINNERS = [
+    [sum(1 << square_bit(s, ROWS, COLS) for s in line) for line in WINNERS if square in line]
+    for square in range(ROWS * COLS)
+    ]
\ No newline at end of file
@@ -0,0 +1,107 @@
+
+import gym
+import numpy as np
+
+from .connect4 import WINNERS, ROWS, COLS
+
+
+QUADS = np.array(WINNERS)
+TOKENS = np.array([1, -1], dtype=np.int8)
+
+
+class Connect4VecEnv():
+    # steps n_envs games of Connect4 at once, each with the same rules and observation as Connect4Env
+    def __init__(self, n_envs, verbose = False):
+        self.name = 'connect4'
+        self.n_envs = n_envs
+        self.rows = ROWS
+        self.cols = COLS
+        self.n_players = 2
+        self.grid_shape = (self.rows, self.cols)
+        self.num_squares = self.rows * self.cols
+        self.action_space = gym.spaces.Discrete(self.cols)
+        self.observation_space = gym.spaces.Box(-1, 1, self.grid_shape + (3, ), dtype=np.int8)
+        self.verbose = verbose
+
+        self.boards = np.zeros((self.n_envs, ) + self.grid_shape, dtype=np.int8)
+        self.heights = np.zeros((self.n_envs, self.cols), dtype=np.int64)
+        self.current_player_num = np.zeros(self.n_envs, dtype=np.int64)
+        self.turns_taken = np.zeros(self.n_envs, dtype=np.int64)
+        self.done = np.zeros(self.n_envs, dtype=bool)
+
+
+    @property
+    def observation(self):
+        tokens = TOKENS[self.current_player_num][:, None, None]
+        filled = self.boards != 0
+        supported = np.ones_like(filled)
+        supported[:, :-1] = filled[:, 1:]
+
+        out = np.stack([self.boards == tokens, self.boards == -tokens, ~filled & supported], axis = -1)
+        return out.astype(self.observation_space.dtype)
+
+    @property
+    def legal_actions(self):
+        return (self.boards[:, 0, :] == 0).astype(int)
+
+
+    def check_game_over(self, envs):
+        flat = self.boards[envs].reshape(len(envs), self.num_squares)
+        tokens = TOKENS[self.current_player_num[envs]]
+        wins = (flat[:, QUADS].sum(axis = -1) == 4 * tokens[:, None]).any(axis = 1)
+        full = self.turns_taken[envs] == self.num_squares
+        return wins.astype(int), wins | full
+
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        envs = np.arange(self.n_envs)
+
+        reward = np.zeros((self.n_envs, self.n_players))
+        done = np.zeros(self.n_envs, dtype=bool)
+
+        # check move legality
+        legal = self.heights[envs, actions] < self.rows
+        illegal = envs[~legal]
+        reward[illegal] = 1
+        reward[illegal, self.current_player_num[illegal]] = -1
+        done[illegal] = True
+
+        moved = envs[legal]
+        moved_actions = actions[legal]
+        rows = self.rows - 1 - self.heights[moved, moved_actions]
+        self.boards[moved, rows, moved_actions] = TOKENS[self.current_player_num[moved]]
+        self.heights[moved, moved_actions] += 1
+        self.turns_taken[moved] += 1
+
+        r, moved_done = self.check_game_over(moved)
+        reward[moved] = -r[:, None]
+        reward[moved, self.current_player_num[moved]] = r
+        done[moved] = moved_done
+
+        self.done = done
+        self.current_player_num[~done] = (self.current_player_num[~done] + 1) % 2
+
+        observation = self.observation
+        infos = [{} for _ in envs]
+        for i in envs[done]:
+            infos[i]['terminal_observation'] = observation[i].copy()
+
+        if done.any():
+            self.reset_envs(envs[done])
+            observation[done] = self.observation[done]
+
+        return observation, reward, done, infos
+
+
+    def reset_envs(self, envs):
+        self.boards[envs] = 0
+        self.heights[envs] = 0
+        self.current_player_num[envs] = 0
+        self.turns_taken[envs] = 0
+
+
+    def reset(self):
+        self.reset_envs(np.arange(self.n_envs))
+        self.done = np.zeros(self.n_envs, dtype=bool)
+        return self.observation
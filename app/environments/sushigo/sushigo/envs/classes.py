@@ -1,4 +1,12 @@
 import random
+import itertools
+import numpy as np
+
+CARD_TYPES = 12
+CHOPSTICKS = 11
+
+# every change to any zone takes a new number, so (zone, version) pairs never repeat
+VERSIONS = itertools.count()
 
 class Player():
     def __init__(self, id):
@@ -91,15 +99,19 @@ class Deck():
     def draw(self, n):
         drawn = []
         for x in range(n):
-            drawn.append(self.cards.pop())
+            card = self.cards.pop()
+            self.counts[card.order] -= 1
+            drawn.append(card)
         return drawn
     
     def add(self, cards):
         for card in cards:
             self.cards.append(card)
+            self.counts[card.order] += 1
 
     def create(self):
         self.cards = []
+        self.counts = np.zeros(len(self.contents), dtype=int)
 
         card_id = 0
         for order, x in enumerate(self.contents):
@@ -115,48 +127,59 @@ class Deck():
         return len(self.cards)
 
 
-class Hand():
+class Zone():
+    # the cards in a zone, plus how many of each card type (indexed by card.order) it holds
     def __init__(self):
-        self.cards = []  
+        self.cards = []
+        self.counts = np.zeros(CARD_TYPES, dtype=int)
+        self.version = next(VERSIONS)
     
     def add(self, cards):
         for card in cards:
             self.cards.append(card)
+            self.counts[card.order] += 1
+        self.version = next(VERSIONS)
     
     def size(self):
         return len(self.cards)
-    
-    def pick(self, name):
+
+    def pick(self, order):
+        if self.counts[order] == 0:
+            return None
         for i, c in enumerate(self.cards):
-            if c.name == name:
+            if c.order == order:
                 self.cards.pop(i)
+                self.counts[order] -= 1
+                self.version = next(VERSIONS)
                 return c
+
+
+class Hand(Zone):
+    pass
         
                 
-class Discard():
-    def __init__(self):
-        self.cards = []  
-    
-    def add(self, cards):
-        for card in cards:
-            self.cards.append(card)
-    
-    def size(self):
-        return len(self.cards)
-    
-class Position():
+class Discard(Zone):
+    pass
+
+
+class Position(Zone):
     def __init__(self):
-        self.cards = []  
-    
+        super(Position, self).__init__()
+        self.free_wasabi = 0
+        # how many of each nigiri type have been played on wasabi
+        self.wasabi_counts = np.zeros(CARD_TYPES, dtype=int)
+
     def add(self, cards):
+        super(Position, self).add(cards)
         for card in cards:
-            self.cards.append(card)
-    
-    def size(self):
-        return len(self.cards)
+            if card.type == 'wasabi' and not card.played_upon:
+                self.free_wasabi += 1
 
-    def pick(self, name):
-        for i, c in enumerate(self.cards):
-            if c.name == name:
-                self.cards.pop(i)
-                return c
+    def play_on_wasabi(self, card):
+        for c in self.cards:
+            if c.type == 'wasabi' and c.played_upon == False:
+                c.played_upon = True
+                card.played_on_wasabi = True
+                self.free_wasabi -= 1
+                self.wasabi_counts[card.order] += 1
+                break
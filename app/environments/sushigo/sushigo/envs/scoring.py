@@ -0,0 +1,61 @@
+import numpy as np
+
+from .classes import Tempura, Sashimi, Dumpling, Maki, Nigiri, Pudding, Wasabi
+
+
+def card_mask(contents, card):
+    return np.array([x['card'] is card for x in contents], dtype=int)
+
+
+def card_values(contents, card):
+    return np.array([x['info']['value'] if x['card'] is card else 0 for x in contents])
+
+
+def split_points(totals, points, best = True):
+    # points shared (rounded down) between everyone tied for the most / fewest, with players on the last axis
+    limit = totals.max(axis = -1, keepdims = True) if best else totals.min(axis = -1, keepdims = True)
+    tied = totals == limit
+    return tied * (points // tied.sum(axis = -1, keepdims = True))
+
+
+class Scorer():
+    # scores every player at once from (..., n_players, card_types) count arrays, so leading axes can batch many games
+    def __init__(self, contents):
+        self.tempura = card_mask(contents, Tempura)
+        self.sashimi = card_mask(contents, Sashimi)
+        self.dumpling = card_mask(contents, Dumpling)
+        self.pudding = card_mask(contents, Pudding)
+        self.wasabi = card_mask(contents, Wasabi)
+        self.maki = card_values(contents, Maki)
+        self.nigiri = card_values(contents, Nigiri)
+
+    def maki_totals(self, counts):
+        return counts.dot(self.maki)
+
+    def score_sets(self, counts):
+        tempura = counts.dot(self.tempura)
+        sashimi = counts.dot(self.sashimi)
+        dumpling = counts.dot(self.dumpling)
+        return (tempura // 2) * 5 + (sashimi // 3) * 10 + np.minimum(15, (dumpling * (dumpling + 1)) // 2)
+
+    def score_nigiri(self, counts, wasabi_counts):
+        # nigiri on wasabi score triple
+        return (counts + 2 * wasabi_counts).dot(self.nigiri)
+
+    def score_maki(self, counts):
+        maki = self.maki_totals(counts)
+        first = split_points(maki, 6)
+
+        # second place only counts when first place is not shared
+        winners = maki == maki.max(axis = -1, keepdims = True)
+        single_winner = winners.sum(axis = -1, keepdims = True) == 1
+        second = split_points(np.where(winners, -1, maki), 3) * single_winner
+
+        return first + second
+
+    def score_round(self, counts, wasabi_counts):
+        return self.score_sets(counts) + self.score_nigiri(counts, wasabi_counts) + self.score_maki(counts)
+
+    def score_puddings(self, counts):
+        puddings = counts.dot(self.pudding)
+        return split_points(puddings, 6) - split_points(puddings, 6, best = False)
@@ -7,19 +7,27 @@ import config
 from stable_baselines import logger
 
 from .classes import *
+from .scoring import Scorer
+
+# layout of the compact observation: the 0/1 entries bit-packed, then one byte per score (score + SCORE_OFFSET)
+# models/sushigo/models.py and utils/runtime.py unpack it with these
+SCORES_START = 864
+PLAYERS = 3
+MAX_SCORE = 100
+SCORE_OFFSET = 128
 
 class SushiGoEnv(gym.Env):
     metadata = {'render.modes': ['human']}
 
-    def __init__(self, verbose = False):
+    def __init__(self, verbose = False, compact = False):
         super(SushiGoEnv, self).__init__()
         self.name = 'sushigo'
-        self.n_players = 3
+        self.n_players = PLAYERS
         self.cards_per_player = 9
         self.card_types = 12
         
         self.n_rounds = 3
-        self.max_score = 100
+        self.max_score = MAX_SCORE
         
         self.total_positions = self.n_players * 2 + 2
 
@@ -39,58 +47,110 @@ class SushiGoEnv(gym.Env):
         ]
 
         self.total_cards = sum([x['count'] for x in self.contents])
+        self.scorer = Scorer(self.contents)
 
         self.action_space = gym.spaces.Discrete(self.card_types + self.card_types * self.card_types)
-        self.observation_space = gym.spaces.Box(0, 1, (self.total_cards * self.total_positions + self.n_players + self.action_space.n ,))
+        self.observation_space = gym.spaces.Box(0, 1, (self.total_cards * self.total_positions + self.n_players + self.action_space.n ,), dtype=np.float32)
         self.verbose = verbose
-
+        self.set_action_tables()
+
+        self.scores_start = self.total_cards * self.total_positions
+        self.legal_actions_start = self.scores_start + self.n_players
+        self.observations = np.zeros((self.n_players, ) + self.observation_space.shape, dtype=self.observation_space.dtype)
+
+        # compact observations bit-pack the 0/1 entries and store each score as a byte, to be expanded inside the policy
+        self.compact = compact
+        if self.compact:
+            n_bytes = (self.observation_space.shape[0] - self.n_players + 7) // 8
+            self.observation_space = gym.spaces.Box(0, 255, (n_bytes + self.n_players, ), dtype=np.uint8)
+        self.card_observations = self.observations[:, :self.scores_start].reshape(self.n_players, self.total_positions, self.total_cards)
+        # seats[viewer, player] is how many places after the viewer the player sits, which sets the player's rows in the viewer's observation
+        self.viewer_index, self.player_index = np.indices((self.n_players, self.n_players))
+        self.seats = (self.player_index - self.viewer_index) % self.n_players
+
+        self.legal_actions_key = None
+
+        self.observation_views = []
+        for player_num in range(self.n_players):
+            view = self.observations[player_num].view()
+            view.flags.writeable = False
+            self.observation_views.append(view)
         
     @property
     def observation(self):
-        obs = np.zeros(([self.total_positions, self.total_cards]))
-        player_num = self.current_player_num
-        hands_seen = 0
-
-        for i in range(self.n_players):
-            player = self.players[player_num]
-
-            if self.turns_taken >= hands_seen:
-                for card in player.hand.cards:
-                    obs[i*2][card.id] = 1
-                
-            for card in player.position.cards:
-                obs[i*2+1][card.id] = 1
-
-            player_num = (player_num + 1) % self.n_players
-            hands_seen += 1
+        obs = self.observations[self.current_player_num]
+        obs[self.scores_start:self.legal_actions_start] = [p.score / self.max_score for p in self.players] # TODO this should be from reference point of the current_player
+        obs[self.legal_actions_start:] = self.legal_actions
+        if self.compact:
+            return self.compact_observation(obs)
+        # read-only view onto the current player's buffer, which is updated in place as cards move
+        return self.observation_views[self.current_player_num]
+
+    def compact_observation(self, obs):
+        bits = np.packbits(np.concatenate([obs[:self.scores_start], obs[self.legal_actions_start:]]) != 0)
+        scores = np.clip(np.rint(obs[self.scores_start:self.legal_actions_start] * self.max_score) + SCORE_OFFSET, 0, 255)
+        return np.concatenate([bits, scores.astype(np.uint8)])
+
+    def update_hidden_observations(self):
+        # hands become visible as they are passed round, and the deck once every hand has been seen
+        hands = np.zeros((self.n_players, self.total_cards))
+        for player_num, player in enumerate(self.players):
+            hands[player_num, [card.id for card in player.hand.cards]] = 1
+
+        visible = (self.turns_taken >= self.seats)[:, :, None]
+        self.card_observations[self.viewer_index, self.seats * 2] = hands[self.player_index] * visible
+
+        if self.turns_taken == self.n_players - 1:
+            self.card_observations[:, 6, [card.id for card in self.deck.cards]] = 1
+
+    def build_observations(self):
+        self.card_observations[:] = 0
+        for player_num, player in enumerate(self.players):
+            ids = [card.id for card in player.position.cards]
+            for viewer_num in range(self.n_players):
+                self.card_observations[viewer_num, self.seats[viewer_num, player_num]*2+1, ids] = 1
+
+        self.card_observations[:, 7, [card.id for card in self.discard.cards]] = 1
 
         if self.turns_taken >= self.n_players - 1:
-            for card in self.deck.cards:
-                obs[6][card.id] = 1
-
-        for card in self.discard.cards:
-            obs[7][card.id] = 1
-        
-        ret = obs.flatten()
-        for p in self.players: # TODO this should be from reference point of the current_player
-            ret = np.append(ret, p.score / self.max_score)
+            self.card_observations[:, 6, [card.id for card in self.deck.cards]] = 1
 
-        ret = np.append(ret, self.legal_actions)
+        self.update_hidden_observations()
 
-        return ret
+    def move_observed_card(self, card, player_num, to_position):
+        # moves a card between a player's hand and position in every viewer's observation
+        for viewer_num in range(self.n_players):
+            i = self.seats[viewer_num, player_num]
+            if to_position:
+                self.card_observations[viewer_num, i*2, card.id] = 0
+                self.card_observations[viewer_num, i*2+1, card.id] = 1
+            else:
+                self.card_observations[viewer_num, i*2, card.id] = self.turns_taken >= i
+                self.card_observations[viewer_num, i*2+1, card.id] = 0
 
     @property
     def legal_actions(self):
+        # only recomputed when the current player's hand or position has changed
+        hand = self.current_player.hand
+        position = self.current_player.position
+        key = (hand.version, position.version)
+        if self.legal_actions_key != key:
+            self.legal_actions_cache = self.get_legal_actions(hand, position)
+            self.legal_actions_cache.flags.writeable = False
+            self.legal_actions_key = key
+        return self.legal_actions_cache
+
+    def get_legal_actions(self, hand, position):
         legal_actions = np.zeros(self.action_space.n)
-        hand = self.current_player.hand.cards
-
-        for i in range(len(hand)):
-            legal_actions[hand[i].order] = 1
-            if 'chopsticks' in [x.type for x in self.current_player.position.cards]:
-                for j in range(i+1, len(hand)):
-                    legal_actions[self.card_types + (hand[i].order * self.card_types) + hand[j].order] = 1
-                    legal_actions[self.card_types + (hand[j].order * self.card_types) + hand[i].order] = 1
-        
+        counts = hand.counts
+        in_hand = counts > 0
+
+        legal_actions[:self.card_types] = in_hand
+        if position.counts[CHOPSTICKS] > 0:
+            # any two cards from the hand, in either order, including two of the same type
+            pairs = np.outer(in_hand, in_hand)
+            np.fill_diagonal(pairs, counts >= 2)
+            legal_actions[self.card_types:] = pairs.flatten()
         
         return legal_actions
 
@@ -120,87 +180,31 @@ class SushiGoEnv(gym.Env):
         return reward
 
 
-    def get_limits(self, counts, type):
-        counts = np.array(counts, dtype=np.float)
-        if type == 'max':
-            type_counts = np.nanmax(counts)
-        else:
-            type_counts = np.nanmin(counts)
-
-        counts_winners = []
-
-        for i, m in enumerate(counts):
-            if m == type_counts:
-                counts_winners.append(i)
-                
-        return counts_winners
+    def position_counts(self):
+        return np.array([p.position.counts for p in self.players])
 
 
     def score_puddings(self):
         logger.debug('\nPudding counts...')
 
-        puddings = []
-        for p in self.players:
-            puddings.append(len([card for card in p.position.cards if card.type == 'pudding']))
-        
-        logger.debug(f'Puddings: {puddings}')
+        counts = self.position_counts()
+        logger.debug(f'Puddings: {counts.dot(self.scorer.pudding)}')
 
-        pudding_winners = self.get_limits(puddings, 'max')
-
-        for i in pudding_winners:
-            self.players[i].score += 6 // len(pudding_winners)
-            logger.debug(f'Player {self.players[i].id} 1st place puddings: {6 // len(pudding_winners)}')
-        
-        pudding_losers = self.get_limits(puddings, 'min')
-
-        for i in pudding_losers:
-            self.players[i].score -= 6 // len(pudding_losers)
-            logger.debug(f'Player {self.players[i].id} last place puddings: {-6 // len(pudding_losers)}')
+        for p, s in zip(self.players, self.scorer.score_puddings(counts)):
+            p.score += int(s)
+            logger.debug(f'Player {p.id} puddings: {s}')
 
 
+    def score_round(self):
+        counts = self.position_counts()
+        wasabi_counts = np.array([p.position.wasabi_counts for p in self.players])
 
-    def score_maki(self, maki):
         logger.debug('\nMaki counts...')
-        logger.debug(f'Maki: {maki}')
-
-        maki_winners = self.get_limits(maki, 'max')
-
-        for i in maki_winners:
-            self.players[i].score += 6 // len(maki_winners)
-            maki[i] = None #mask out the winners
-            logger.debug(f'Player {self.players[i].id} 1st place maki: {6 // len(maki_winners)}')
-        
-        if len(maki_winners) == 1:
-            #now get second place as winners are masked with None
-            maki_winners = self.get_limits(maki, 'max')
-
-            for i in maki_winners:
-                self.players[i].score += 3 // len(maki_winners)
-                logger.debug(f'Player {self.players[i].id} 2nd place maki: {3 // len(maki_winners)}')
-
-
-    def score_round(self):
+        logger.debug(f'Maki: {self.scorer.maki_totals(counts)}')
 
-        maki = [0] * self.n_players
-        
-        for i, p in enumerate(self.players):
-            count = {'tempura': 0, 'sashimi': 0, 'dumpling': 0}
-            for card in p.position.cards:
-                if card.type in ('tempura', 'sashimi', 'dumpling'):
-                    count[card.type] += 1
-                elif card.type == 'maki':
-                    maki[i] += card.value
-                elif card.type == 'nigiri':
-                    if card.played_on_wasabi:
-                        p.score += 3 * card.value
-                    else:
-                        p.score += card.value
-
-            p.score += (count['tempura'] // 2) * 5
-            p.score += (count['sashimi'] // 3) * 10
-            p.score += min(15, (count['dumpling'] * (count['dumpling'] + 1) ) // 2)
-        
-        self.score_maki(maki)
+        for p, s in zip(self.players, self.scorer.score_round(counts, wasabi_counts)):
+            p.score += int(s)
+            logger.debug(f'Player {p.id} round score: {s}')
 
 
     @property
@@ -219,26 +223,23 @@ class SushiGoEnv(gym.Env):
 
     def pickup_chopsticks(self, player):
         logger.debug(f'Player {player.id} picking up chopsticks')
-        chopsticks = player.position.pick('chopsticks')
+        chopsticks = player.position.pick(CHOPSTICKS)
         player.hand.add([chopsticks])
+        self.move_observed_card(chopsticks, self.players.index(player), to_position = False)
 
     def play_card(self, card_num, player):
 
-        card_name = self.contents[card_num]['info']['name']
-        card = player.hand.pick(card_name)
+        card = player.hand.pick(card_num)
         if card is None:
             logger.debug(f"Player {player.id} trying to play {card_num} but doesn't exist!")
             raise Exception('Card not found')
 
         logger.debug(f"Player {player.id} playing {str(card.order) + ': ' + card.symbol + ': ' + str(card.id)}")
-        if card.type == 'nigiri':
-            for c in player.position.cards:
-                if c.type == 'wasabi' and c.played_upon == False:
-                    c.played_upon = True
-                    card.played_on_wasabi = True
-                    break
+        if card.type == 'nigiri' and player.position.free_wasabi > 0:
+            player.position.play_on_wasabi(card)
 
         player.position.add([card])
+        self.move_observed_card(card, self.players.index(player), to_position = True)
 
 
     def switch_hands(self):
@@ -287,6 +288,7 @@ class SushiGoEnv(gym.Env):
 
             if self.current_player_num == 0:
                 self.turns_taken += 1
+                self.update_hidden_observations()
 
             if self.turns_taken == self.cards_per_player:
                 self.score_round()
@@ -315,6 +317,7 @@ class SushiGoEnv(gym.Env):
         
         self.round += 1
         self.turns_taken = 0
+        self.build_observations()
 
     def reset(self):
         self.round = 0
@@ -378,5 +381,64 @@ class SushiGoEnv(gym.Env):
                 logger.debug(f'Player {p.id} points: {p.score}')
 
 
+    def set_action_tables(self):
+        # how each action changes the acting player's position (a chopstick pair sends the chopsticks back to the hand)
+        n = self.action_space.n
+        self.action_counts = np.zeros((n, self.card_types), dtype=int)
+        self.first_cards = np.zeros((n, self.card_types), dtype=int)
+        self.second_cards = np.zeros((n, self.card_types), dtype=int)
+        for action in range(n):
+            pickup_chopsticks, first_card, second_card = self.convert_action(action)
+            self.first_cards[action, first_card] = 1
+            if pickup_chopsticks:
+                self.second_cards[action, second_card] = 1
+                self.action_counts[action, CHOPSTICKS] -= 1
+        self.action_counts += self.first_cards + self.second_cards
+
+        nigiri = self.scorer.nigiri > 0
+        self.first_nigiri = self.first_cards.dot(nigiri)
+        self.second_nigiri = self.second_cards.dot(nigiri)
+        self.first_wasabi = self.first_cards.dot(self.scorer.wasabi)
+        self.second_wasabi = self.second_cards.dot(self.scorer.wasabi)
+        self.cards_taken = 1 + self.second_cards.sum(axis = 1)
+
+    def rules_potential(self, counts, free_wasabi, cards_left):
+        # rough credit for unfinished sets, worth less as the round runs out of cards
+        tempura = counts.dot(self.scorer.tempura) % 2
+        sashimi = counts.dot(self.scorer.sashimi) % 3
+        potential = 2.5 * tempura + np.array([0, 2, 5])[sashimi] + 3 * free_wasabi + 2 * counts[:, CHOPSTICKS]
+        return potential * cards_left / self.cards_per_player
+
+    def rules_values(self, actions):
+        # the acting player's round and pudding score after each action, plus credit for unfinished sets
+        player_num = self.current_player_num
+        position = self.current_player.position
+
+        # a nigiri goes on a free wasabi, including one played as the first card of a chopstick pair
+        first_on_wasabi = self.first_nigiri[actions] * (position.free_wasabi > 0)
+        free_wasabi = position.free_wasabi - first_on_wasabi + self.first_wasabi[actions]
+        second_on_wasabi = self.second_nigiri[actions] * (free_wasabi > 0)
+        free_wasabi = free_wasabi - second_on_wasabi + self.second_wasabi[actions]
+
+        counts = np.repeat(self.position_counts()[None], len(actions), axis = 0)
+        wasabi_counts = np.repeat(np.array([p.position.wasabi_counts for p in self.players])[None], len(actions), axis = 0)
+        counts[:, player_num] += self.action_counts[actions]
+        wasabi_counts[:, player_num] += self.first_cards[actions] * first_on_wasabi[:, None] + self.second_cards[actions] * second_on_wasabi[:, None]
+
+        scores = self.scorer.score_round(counts, wasabi_counts) + self.scorer.score_puddings(counts)
+        cards_left = self.current_player.hand.size() - self.cards_taken[actions]
+        return scores[:, player_num] + self.rules_potential(counts[:, player_num], free_wasabi, cards_left)
+
     def rules_move(self):
-        raise Exception('Rules based agent is not yet implemented for Sushi Go!')
+        WRONG_MOVE_PROB = 0.01
+        legal_actions = self.legal_actions
+        actions = np.flatnonzero(legal_actions)
+
+        values = self.rules_values(actions)
+        best_actions = actions[values == values.max()]
+        if logger.get_level() <= config.DEBUG:
+            logger.debug(f'Rules values: {dict(zip(actions, values.round(2)))}')
+
+        action_probs = WRONG_MOVE_PROB * legal_actions
+        action_probs[best_actions] = (1 - WRONG_MOVE_PROB * (len(actions) - len(best_actions))) / len(best_actions)
+        return action_probs
@@ -33,20 +33,29 @@ class TicTacToeEnv(gym.Env):
         self.num_squares = self.grid_length * self.grid_length
         self.grid_shape = (self.grid_length, self.grid_length)
         self.action_space = gym.spaces.Discrete(self.num_squares)
-        self.observation_space = gym.spaces.Box(-1, 1, self.grid_shape+(2,))
+        self.observation_space = gym.spaces.Box(-1, 1, self.grid_shape+(2,), dtype=np.int8)
         self.verbose = verbose
+
+        self.observations = np.zeros((self.n_players, ) + self.grid_shape + (2, ), dtype=self.observation_space.dtype)
+        self.observation_views = []
+        for player in range(self.n_players):
+            view = self.observations[player].view()
+            view.flags.writeable = False
+            self.observation_views.append(view)
         
 
     @property
     def observation(self):
-        if self.players[self.current_player_num].token.number == 1:
-            position = np.array([x.number for x in self.board]).reshape(self.grid_shape)
-        else:
-            position = np.array([-x.number for x in self.board]).reshape(self.grid_shape)
+        # read-only view onto the current player's buffer, which is updated in place by step
+        return self.observation_views[self.current_player_num]
+
+    def update_observations(self, square):
+        player = self.current_player_num
+        row, col = divmod(square, self.grid_length)
 
-        la_grid = np.array(self.legal_actions).reshape(self.grid_shape)
-        out = np.stack([position,la_grid], axis = -1)
-        return out
+        self.observations[player, row, col, 0] = 1
+        self.observations[1 - player, row, col, 0] = -1
+        self.observations[:, row, col, 1] = 0
 
     @property
     def legal_actions(self):
@@ -64,23 +73,18 @@ class TicTacToeEnv(gym.Env):
     def square_is_player(self, square, player):
         return self.board[square].number == self.players[player].token.number
 
-    def check_game_over(self):
+    def check_game_over(self, square = None):
 
-        board = self.board
         current_player_num = self.current_player_num
-        players = self.players
-
 
-        # check game over
-        for i in range(self.grid_length):
-            # horizontals and verticals
-            if ((self.square_is_player(i*self.grid_length,current_player_num) and self.square_is_player(i*self.grid_length+1,current_player_num) and self.square_is_player(i*self.grid_length+2,current_player_num))
-                or (self.square_is_player(i+0,current_player_num) and self.square_is_player(i+self.grid_length,current_player_num) and self.square_is_player(i+self.grid_length*2,current_player_num))):
-                return  1, True
+        if square is None:
+            lines = WINNERS
+        else:
+            # only lines through the square just played can have been completed
+            lines = SQUARE_WINNERS[square]
 
-        # diagonals
-        if((self.square_is_player(0,current_player_num) and self.square_is_player(4,current_player_num) and self.square_is_player(8,current_player_num))
-            or (self.square_is_player(2,current_player_num) and self.square_is_player(4,current_player_num) and self.square_is_player(6,current_player_num))):
+        for line in lines:
+            if all(self.square_is_player(x, current_player_num) for x in line):
                 return  1, True
 
         if self.turns_taken == self.num_squares:
@@ -107,8 +111,9 @@ class TicTacToeEnv(gym.Env):
             reward[self.current_player_num] = -1
         else:
             board[action] = self.current_player.token
+            self.update_observations(action)
             self.turns_taken += 1
-            r, done = self.check_game_over()
+            r, done = self.check_game_over(action)
             reward = [-r,-r]
             reward[self.current_player_num] = r
 
@@ -121,6 +126,8 @@ class TicTacToeEnv(gym.Env):
 
     def reset(self):
         self.board = [Token('.', 0)] * self.num_squares
+        self.observations[:, :, :, 0] = 0
+        self.observations[:, :, :, 1] = 1
         self.players = [Player('1', Token('X', 1)), Player('2', Token('O', -1))]
         self.current_player_num = 0
         self.turns_taken = 0
@@ -206,6 +213,15 @@ class TicTacToeEnv(gym.Env):
         return action_probs   
 
 
+WINNERS = [
+    [0, 1, 2], [3, 4, 5], [6, 7, 8], # horizontals
+    [0, 3, 6], [1, 4, 7], [2, 5, 8], # verticals
+    [0, 4, 8], [2, 4, 6], # diagonals
+    ]
+
+SQUARE_WINNERS = [[line for line in WINNERS if square in line] for square in range(9)]
+
+
 def checkWin(b, m):
     return ((b[0] == m and b[1] == m and b[2] == m) or  # H top
             (b[3] == m and b[4] == m and b[5] == m) or  # H mid
@@ -0,0 +1,88 @@
+# docker-compose exec app python3 export.py -e tictactoe -m best_model
+
+import os
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3' 
+
+import tensorflow as tf
+tf.get_logger().setLevel('INFO')
+tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
+
+import argparse
+import numpy as np
+
+from stable_baselines.ppo1 import PPO1
+from stable_baselines import logger
+
+from utils.export import export_params, export_differences, EXPORT_TOLERANCE
+from utils.register import get_environment, get_env_kwargs
+
+import config
+
+
+def sample_observations(env, n):
+  # observations from random legal play, to check the exported policy against the live one
+  observations = []
+  while len(observations) < n:
+    env.reset()
+    done = False
+    while not done and len(observations) < n:
+      observations.append(np.array(env.observation))
+      _, _, done, _ = env.step(np.random.choice(np.flatnonzero(env.legal_actions)))
+  return np.array(observations)
+
+
+def main(args):
+
+  logger.configure(config.LOGDIR)
+  logger.set_level(config.INFO)
+
+  model_dir = os.path.join(config.MODELDIR, args.env_name)
+  np.random.seed(args.seed)
+
+  for name in args.models:
+    filename = os.path.join(model_dir, f'{name}.zip')
+    data, params = PPO1._load_from_file(filename)
+    compact = data['observation_space'].dtype == np.uint8
+    env = get_environment(args.env_name)(verbose = False, **get_env_kwargs(args.env_name, compact))
+    env.seed(args.seed)
+
+    # the .npz is only put in place once it gives the same outputs as the model it came from
+    tmp_path = os.path.join(model_dir, f'{name}.{os.getpid()}.tmp.npz')
+    export_params(params, data['observation_space'], args.env_name, tmp_path)
+    probs_diff, value_diff = export_differences(PPO1.load(filename, env), tmp_path, sample_observations(env, args.observations))
+    if probs_diff > EXPORT_TOLERANCE or value_diff > EXPORT_TOLERANCE:
+      os.remove(tmp_path)
+      raise Exception(f'Exported {name} does not match {name}.zip (max difference {probs_diff:.2e} in action probabilities, {value_diff:.2e} in value)')
+
+    os.replace(tmp_path, os.path.join(model_dir, f'{name}.npz'))
+    logger.info(f'Exported {name}.zip to {name}.npz (max difference {max(probs_diff, value_diff):.2e} over {args.observations} observations)')
+
+
+def cli() -> None:
+  """Handles argument extraction from CLI and passing to main().
+  Note that a separate function is used rather than in __name__ == '__main__'
+  to allow unit testing of cli().
+  """
+  # Setup argparse to show defaults on help
+  formatter_class = argparse.ArgumentDefaultsHelpFormatter
+  parser = argparse.ArgumentParser(formatter_class=formatter_class)
+
+  parser.add_argument("--models","-m", nargs = '+', type=str, default = ['best_model']
+                , help="Models in the zoo to export to the NumPy runtime")
+  parser.add_argument("--env_name", "-e",  type = str, default = 'tictactoe'
+            , help="Which game are the models for?")
+  parser.add_argument("--observations", "-o",  type = int, default = 256
+            , help="Number of observations from random play to check the export on")
+  parser.add_argument("--seed", "-s",  type = int, default = 17
+            , help="Random seed")
+
+  # Extract args
+  args = parser.parse_args()
+
+  # Enter main
+  main(args)
+  return
+
+
+if __name__ == '__main__':
+  cli()
@@ -8,6 +8,8 @@ import tensorflow.keras.backend as K
 from stable_baselines.common.policies import ActorCriticPolicy
 from stable_baselines.common.distributions import CategoricalProbabilityDistribution
 
+from butterfly.envs.butterfly import SCORES_START, PLAYERS, MAX_SCORE, SCORE_OFFSET
+
 
 ACTIONS = 200
 FEATURE_SIZE = 128
@@ -15,13 +17,20 @@ DEPTH = 5
 VALUE_DEPTH = 1
 POLICY_DEPTH = 1
 
+
 class CustomPolicy(ActorCriticPolicy):
     def __init__(self, sess, ob_space, ac_space, n_env, n_steps, n_batch, reuse=False, **kwargs):
         super(CustomPolicy, self).__init__(sess, ob_space, ac_space, n_env, n_steps, n_batch, reuse=reuse, scale=True)
 
         with tf.variable_scope("model", reuse=reuse):
 
-            obs, legal_actions = split_input(self.processed_obs, ACTIONS)
+            if ob_space.dtype == np.uint8:
+                # compact observations are expanded from the raw bytes rather than rescaled to [0, 1]
+                processed_obs = unpack_observation(self.obs_ph)
+            else:
+                processed_obs = self.processed_obs
+
+            obs, legal_actions = split_input(processed_obs, ACTIONS)
 
             extracted_features = resnet_extractor(obs, **kwargs)
 
@@ -46,6 +55,19 @@ class CustomPolicy(ActorCriticPolicy):
     def value(self, obs, state=None, mask=None):
         return self.sess.run(self.value_flat, {self.obs_ph: obs})
 
+    def proba_value_step(self, obs, state=None, mask=None):
+        return self.sess.run([self.policy_proba, self.value_flat], {self.obs_ph: obs})
+
+
+def unpack_observation(obs):
+    # the env's compact observation is its 0/1 entries bit-packed, followed by one byte per score
+    n_bytes = obs.shape.as_list()[1] - PLAYERS
+    packed = tf.cast(obs[:, :n_bytes], tf.int32)
+    bits = tf.bitwise.bitwise_and(tf.bitwise.right_shift(packed[:, :, None], tf.range(7, -1, -1)), 1)
+    bits = tf.cast(tf.reshape(bits, [-1, n_bytes * 8])[:, :SCORES_START + ACTIONS], tf.float32)
+    scores = (tf.cast(obs[:, n_bytes:], tf.float32) - SCORE_OFFSET) / MAX_SCORE
+    return tf.concat([bits[:, :SCORES_START], scores, bits[:, SCORES_START:]], axis = 1)
+
 
 def split_input(obs, split):
     return   obs[:,:-split], obs[:,-split:]
@@ -39,6 +39,9 @@ class CustomPolicy(ActorCriticPolicy):
     def value(self, obs, state=None, mask=None):
         return self.sess.run(self.value_flat, {self.obs_ph: obs})
 
+    def proba_value_step(self, obs, state=None, mask=None):
+        return self.sess.run([self.policy_proba, self.value_flat], {self.obs_ph: obs})
+
 
 
 def value_head(y):
@@ -13,7 +13,9 @@ import argparse
 from stable_baselines import logger
 
 from utils.files import load_model, write_results
-from utils.register import get_environment
+from utils.ratings import Ratings
+from utils.runtime import load_numpy_model
+from utils.register import get_environment, get_env_kwargs
 from utils.agents import Agent
 
 import config
@@ -29,7 +31,7 @@ def main(args):
     logger.set_level(config.INFO)
     
   #make environment
-  env = get_environment(args.env_name)(verbose = args.verbose)
+  env = get_environment(args.env_name)(verbose = args.verbose, **get_env_kwargs(args.env_name, args.compact))
   env.seed(args.seed)
 
   total_rewards = {}
@@ -47,10 +49,16 @@ def main(args):
     elif agent == 'rules':
       agent_obj = Agent('rules')
     elif agent == 'base':
-      base_model = load_model(env, 'base.zip')
+      if args.numpy:
+        base_model = load_numpy_model(env, 'base.npz')
+      else:
+        base_model = load_model(env, 'base.zip')
       agent_obj = Agent('base', base_model)   
     else:
-      ppo_model = load_model(env, f'{agent}.zip')
+      if args.numpy:
+        ppo_model = load_numpy_model(env, f'{agent}.npz')
+      else:
+        ppo_model = load_model(env, f'{agent}.zip')
       ppo_agent = i
       agent_obj = Agent(agent, ppo_model)
     agents.append(agent_obj)
@@ -58,6 +66,7 @@ def main(args):
   
   #play games
   logger.info(f'\nPlaying {args.games} games...')
+  games = []
   for game in range(args.games):
     players = agents[:]
 
@@ -112,9 +121,16 @@ def main(args):
     if args.write_results:
       write_results(players, game, args.games, env.turns_taken)
 
+    # only games between zoo models are rated
+    if all(p.name not in ('human', 'rules') for p in players):
+      games.append(([p.name for p in players], [p.points for p in players]))
+
     for p in players:
       p.points = 0
 
+  if args.ratings:
+    Ratings(env.name).update(games)
+
   env.close()
     
 
@@ -148,6 +164,12 @@ def cli() -> None:
             , help="Write results to a file?")
   parser.add_argument("--seed", "-s",  type = int, default = 17
             , help="Random seed")
+  parser.add_argument("--numpy", "-n",  action = 'store_true', default = False
+            , help="Run AI agents with the NumPy runtime, from models exported by export.py")
+  parser.add_argument("--ratings", "-ra",  action = 'store_true', default = False
+            , help="Update the Elo ratings in zoo/<env>/ratings.db with the results")
+  parser.add_argument("--compact", "-co",  action = 'store_true', default = False
+            , help="Bit-packed uint8 observations (sushigo, butterfly), for models trained with train.py --compact")
 
   # Extract args
   args = parser.parse_args()
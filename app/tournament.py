@@ -0,0 +1,179 @@
+# docker-compose exec app python3 tournament.py -e connect4 -g 10 -st 5 -ru
+
+import os
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import argparse
+import multiprocessing
+import random
+import time
+import numpy as np
+
+from stable_baselines import logger
+
+from utils.files import get_model_names, get_results_row, write_results_rows
+from utils.ratings import Ratings
+from utils.register import get_environment, get_env_kwargs
+from utils.agents import Agent
+
+import config
+
+
+# each pool process keeps one env and its loaded models for the whole tournament
+worker = {}
+
+
+def init_worker(args):
+  logger.configure(format_strs=[])
+  logger.set_level(config.WARN)
+
+  env = get_environment(args.env_name)(verbose = False, **get_env_kwargs(args.env_name, args.compact))
+  worker['env'] = env
+  worker['args'] = args
+  worker['models'] = {}
+
+  if not args.numpy:
+    # every generation shares one policy graph, with weights swapped in as each one is used
+    from utils.pool import get_opponent_zoo
+    worker['zoo'] = get_opponent_zoo(env)
+
+
+def get_model(name):
+  models = worker['models']
+
+  if name not in models:
+    if worker['args'].numpy:
+      from utils.runtime import load_numpy_model
+      models[name] = load_numpy_model(worker['env'], f'{name}.npz')
+    else:
+      from utils.pool import ZooModel
+      models[name] = ZooModel(worker['zoo'], f'{name}.zip')
+
+  return models[name]
+
+
+def play_match(match):
+  i, names = match
+  env = worker['env']
+  args = worker['args']
+
+  random.seed(args.seed + i)
+  np.random.seed(args.seed + i)
+  env.seed(args.seed + i)
+
+  players = [Agent('rules') if name == 'rules' else Agent(name, get_model(name)) for name in names]
+
+  rows = []
+  games = []
+  for game in range(args.games):
+    env.reset()
+    done = False
+
+    while not done:
+      current_player = players[env.current_player_num]
+      choose_best_action = args.best and current_player.name != 'rules'
+      action = current_player.choose_action(env, choose_best_action = choose_best_action, mask_invalid_actions = True)
+      _, reward, done, _ = env.step(action)
+
+      for r, player in zip(reward, players):
+        player.points += r
+
+    rows.append(get_results_row(players, game, args.games, env.turns_taken))
+    games.append((list(names), [p.points for p in players]))
+
+    for p in players:
+      p.points = 0
+
+  return rows, games
+
+
+def get_matches(names, n_players, rules):
+  # the same pairings as scripts/eval_2_player.sh and eval_3_player.sh: each model as player 1
+  # against every model filling the other seats, then each model against the rules-based agent
+  matches = [(f, ) + (g, ) * (n_players - 1) for f in names for g in names]
+
+  if rules:
+    matches += [(f, ) + ('rules', ) * (n_players - 1) for f in names]
+    matches += [('rules', ) + (g, ) * (n_players - 1) for g in names]
+    matches.append(('rules', ) * n_players)
+
+  return matches
+
+
+def main(args):
+
+  logger.configure(config.LOGDIR)
+  logger.set_level(config.INFO)
+
+  names = args.models
+  if names is None:
+    names = ['best_model'] + [name[:-len('.zip')] for name in get_model_names(args.env_name)]
+  names = names[::args.step]
+
+  n_players = get_environment(args.env_name)(verbose = False, **get_env_kwargs(args.env_name, args.compact)).n_players
+  matches = get_matches(names, n_players, args.rules)
+  logger.info(f'\nPlaying {len(matches)} matches of {args.games} games between {len(names)} models on {args.processes} processes...')
+
+  start = time.time()
+  rows = []
+  games = []
+
+  # spawn rather than fork, so that each process builds its own TensorFlow session
+  with multiprocessing.get_context('spawn').Pool(args.processes, initializer = init_worker, initargs = (args, )) as pool:
+    for i, (match_rows, match_games) in enumerate(pool.imap(play_match, enumerate(matches))):
+      rows += match_rows
+      games += match_games
+      p1_points = sum(r['p1_points'] for r in match_rows)
+      p2_points = sum(r['p2_points'] for r in match_rows)
+      logger.info(f'{i + 1}/{len(matches)} {" v ".join(matches[i])}: {p1_points:.2f} v {p2_points:.2f}')
+
+  if os.path.exists(config.RESULTSPATH) and not args.append:
+    os.remove(config.RESULTSPATH)
+  write_results_rows(rows)
+  Ratings(args.env_name).update(games)
+
+  logger.info(f'\nWrote {len(rows)} results to {config.RESULTSPATH} in {time.time() - start:.1f}s')
+
+
+def cli() -> None:
+  """Handles argument extraction from CLI and passing to main().
+  Note that a separate function is used rather than in __name__ == '__main__'
+  to allow unit testing of cli().
+  """
+  # Setup argparse to show defaults on help
+  formatter_class = argparse.ArgumentDefaultsHelpFormatter
+  parser = argparse.ArgumentParser(formatter_class=formatter_class)
+
+  parser.add_argument("--env_name", "-e",  type = str, default = 'tictactoe'
+            , help="Which game to play?")
+  parser.add_argument("--models", "-m", nargs = '+', type = str, default = None
+            , help="Which models to include (default best_model and every generation in the zoo)")
+  parser.add_argument("--step", "-st", type = int, default = 1
+            , help="Only include every nth model")
+  parser.add_argument("--games", "-g", type = int, default = 10
+            , help="Number of games to play per match")
+  parser.add_argument("--rules", "-ru", action = 'store_true', default = False
+            , help="Also play each model against the rules-based agent")
+  parser.add_argument("--best", "-b", action = 'store_true', default = False
+            , help="Make AI agents choose the best move (rather than sampling)")
+  parser.add_argument("--processes", "-p", type = int, default = os.cpu_count()
+            , help="Number of processes to play matches on")
+  parser.add_argument("--numpy", "-n",  action = 'store_true', default = False
+            , help="Run AI agents with the NumPy runtime, from models exported by export.py")
+  parser.add_argument("--compact", "-co",  action = 'store_true', default = False
+            , help="Bit-packed uint8 observations (sushigo, butterfly), for models trained with train.py --compact")
+  parser.add_argument("--append", "-a",  action = 'store_true', default = False
+            , help="Append to the results file rather than replacing it")
+  parser.add_argument("--seed", "-s",  type = int, default = 17
+            , help="Random seed")
+
+  # Extract args
+  args = parser.parse_args()
+
+  # Enter main
+  main(args)
+  return
+
+
+if __name__ == '__main__':
+  cli()
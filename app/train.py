@@ -9,7 +9,6 @@ tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
 
 
 import argparse
-import time
 from shutil import copyfile
 from mpi4py import MPI
 
@@ -21,8 +20,8 @@ from stable_baselines.common import set_global_seeds
 from stable_baselines import logger
 
 from utils.callbacks import SelfPlayCallback
-from utils.files import reset_files
-from utils.register import get_network_arch, get_environment
+from utils.files import reset_files, create_base_model
+from utils.register import get_network_arch, get_environment, get_env_kwargs
 from utils.selfplay import selfplay_wrapper
 
 import config
@@ -30,6 +29,7 @@ import config
 def main(args):
 
   rank = MPI.COMM_WORLD.Get_rank()
+  env_kwargs = get_env_kwargs(args.env_name, args.compact)
 
   model_dir = os.path.join(config.MODELDIR, args.env_name)
 
@@ -47,15 +47,20 @@ def main(args):
   if args.debug:
     logger.set_level(config.DEBUG)
   else:
-    time.sleep(5)
     logger.set_level(config.INFO)
 
   workerseed = args.seed + 10000 * MPI.COMM_WORLD.Get_rank()
   set_global_seeds(workerseed)
 
-  logger.info('\nSetting up the selfplay training environment opponents...')
   base_env = get_environment(args.env_name)
-  env = selfplay_wrapper(base_env)(opponent_type = args.opponent_type, verbose = args.verbose)
+
+  # rank 0 prepares the zoo (and base.zip for a new one) while the other ranks wait
+  if rank == 0 and not os.path.exists(os.path.join(model_dir, 'base.zip')):
+    create_base_model(base_env(verbose = False, **env_kwargs))
+  MPI.COMM_WORLD.Barrier()
+
+  logger.info('\nSetting up the selfplay training environment opponents...')
+  env = selfplay_wrapper(base_env)(opponent_type = args.opponent_type, verbose = args.verbose, shared_graph = args.shared_graph, **env_kwargs)
   env.seed(workerseed)
 
   
@@ -75,8 +80,6 @@ def main(args):
       , 'tensorboard_log':config.LOGDIR
   }
 
-  time.sleep(5) # allow time for the base model to be saved out when the environment is created
-
   if args.reset or not os.path.exists(os.path.join(model_dir, 'best_model.zip')):
     logger.info('\nLoading the base PPO agent to train...')
     model = PPO1.load(os.path.join(model_dir, 'base.zip'), env, **params)
@@ -87,7 +90,7 @@ def main(args):
   #Callbacks
   logger.info('\nSetting up the selfplay evaluation environment opponents...')
   callback_args = {
-    'eval_env': selfplay_wrapper(base_env)(opponent_type = args.opponent_type, verbose = args.verbose),
+    'eval_env': selfplay_wrapper(base_env)(opponent_type = args.opponent_type, verbose = args.verbose, shared_graph = args.shared_graph, **env_kwargs),
     'best_model_save_path' : config.TMPMODELDIR,
     'log_path' : config.LOGDIR,
     'eval_freq' : args.eval_freq,
@@ -101,7 +104,7 @@ def main(args):
     logger.info('\nSetting up the evaluation environment against the rules-based agent...')
     # Evaluate against a 'rules' agent as well
     eval_actual_callback = EvalCallback(
-      eval_env = selfplay_wrapper(base_env)(opponent_type = 'rules', verbose = args.verbose),
+      eval_env = selfplay_wrapper(base_env)(opponent_type = 'rules', verbose = args.verbose, shared_graph = args.shared_graph, **env_kwargs),
       eval_freq=1,
       n_eval_episodes=args.n_eval_episodes,
       deterministic = args.best,
@@ -134,7 +137,7 @@ def cli() -> None:
   parser.add_argument("--reset", "-r", action = 'store_true', default = False
                 , help="Start retraining the model from scratch")
   parser.add_argument("--opponent_type", "-o", type = str, default = 'mostly_best'
-              , help="best / mostly_best / random / base / rules - the type of opponent to train against")
+              , help="best / mostly_best / random / rated / base / rules - the type of opponent to train against")
   parser.add_argument("--debug", "-d", action = 'store_true', default = False
               , help="Debug logging")
   parser.add_argument("--verbose", "-v", action = 'store_true', default = False
@@ -143,6 +146,10 @@ def cli() -> None:
               , help="Evaluate on a ruled-based agent")
   parser.add_argument("--best", "-b", action = 'store_true', default = False
               , help="Uses best moves when evaluating agent against rules-based agent")
+  parser.add_argument("--shared_graph", "-sg", action = 'store_true', default = False
+              , help="Keep opponents as weight sets swapped into one shared policy graph, rather than one graph per opponent")
+  parser.add_argument("--compact", "-co", action = 'store_true', default = False
+              , help="Bit-packed uint8 observations (sushigo, butterfly). Models trained on dense observations can't load these, so use with a fresh zoo (--reset)")
   parser.add_argument("--env_name", "-e", type = str, default = 'tictactoe'
               , help="Which gym environment to train in: tictactoe, connect4, sushigo")
   parser.add_argument("--seed", "-s",  type = int, default = 17
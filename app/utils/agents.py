@@ -34,22 +34,26 @@ class Agent():
     top5_actions = action_probs[top5_action_idx]
     logger.debug(f"Top 5 actions: {[str(i) + ': ' + str(round(a,2))[:5] for i,a in zip(top5_action_idx, top5_actions)]}")
 
-  def choose_action(self, env, choose_best_action, mask_invalid_actions):
-      if self.name == 'rules':
-        action_probs = np.array(env.rules_move())
-        value = None
-      else:
-        action_probs = self.model.action_probability(env.observation)
-        value = self.model.policy_pi.value(np.array([env.observation]))[0]
-        logger.debug(f'Value {value:.2f}')
-
-      self.print_top_actions(action_probs)
-      
+  def model_action_probs(self, observations):
+      # one model call for a batch of observations
+      # the values are only used for logging, so they are only fetched when they will be seen
+      if logger.get_level() <= config.DEBUG:
+        return self.model.policy_pi.proba_value_step(observations)
+      return self.model.policy_pi.proba_step(observations), None
+
+  def pick_action(self, env, action_probs, choose_best_action, mask_invalid_actions, value = None):
+      debug = logger.get_level() <= config.DEBUG
+      if debug:
+        if value is not None:
+          logger.debug(f'Value {value:.2f}')
+        self.print_top_actions(action_probs)
+
       if mask_invalid_actions:
         action_probs = mask_actions(env.legal_actions, action_probs)
-        logger.debug('Masked ->')
-        self.print_top_actions(action_probs)
-        
+        if debug:
+          logger.debug('Masked ->')
+          self.print_top_actions(action_probs)
+
       action = np.argmax(action_probs)
       logger.debug(f'Best action {action}')
 
@@ -59,5 +63,19 @@ class Agent():
 
       return action
 
+  def choose_action(self, env, choose_best_action, mask_invalid_actions):
+      if self.name == 'rules':
+        return self.pick_action(env, np.array(env.rules_move()), choose_best_action, mask_invalid_actions)
+
+      return self.choose_actions([env], choose_best_action, mask_invalid_actions)[0]
+
+  def choose_actions(self, envs, choose_best_action, mask_invalid_actions):
+      # choose_action for several envs, with one model call for all of them
+      if self.name == 'rules':
+        return [self.choose_action(env, choose_best_action, mask_invalid_actions) for env in envs]
 
+      action_probs, values = self.model_action_probs(np.array([env.observation for env in envs]))
+      if values is None:
+        values = [None] * len(envs)
 
+      return [self.pick_action(env, probs, choose_best_action, mask_invalid_actions, value) for env, probs, value in zip(envs, action_probs, values)]
@@ -1,12 +1,13 @@
 import os
 import numpy as np
-from shutil import copyfile
 from mpi4py import MPI
 
 from stable_baselines.common.callbacks import EvalCallback
 from stable_baselines import logger
 
-from utils.files import get_best_model_name, get_model_stats
+from utils.files import get_best_model_name, get_model_stats, publish_file
+from utils.ratings import Ratings
+from utils.zoo import get_zoo_index
 
 import config
 
@@ -14,6 +15,7 @@ class SelfPlayCallback(EvalCallback):
   def __init__(self, opponent_type, threshold, env_name, *args, **kwargs):
     super(SelfPlayCallback, self).__init__(*args, **kwargs)
     self.opponent_type = opponent_type
+    self.env_name = env_name
     self.model_dir = os.path.join(config.MODELDIR, env_name)
     self.generation, self.base_timesteps, pbmr, bmr = get_model_stats(get_best_model_name(env_name))
 
@@ -32,7 +34,9 @@ class SelfPlayCallback(EvalCallback):
 
     if self.eval_freq > 0 and self.n_calls % self.eval_freq == 0:
 
+      self.start_recording()
       result = super(SelfPlayCallback, self)._on_step() #this will set self.best_mean_reward to the reward from the evaluation as it's previously -np.inf
+      eval_results = MPI.COMM_WORLD.allgather(self.stop_recording())
 
       list_of_rewards = MPI.COMM_WORLD.allgather(self.best_mean_reward)
       av_reward = np.mean(list_of_rewards)
@@ -65,9 +69,12 @@ class SelfPlayCallback(EvalCallback):
           
           source_file = os.path.join(config.TMPMODELDIR, f"best_model.zip") # this is constantly being written to - not actually the best model
           target_file = os.path.join(self.model_dir,  f"_model_{generation_str}_{av_rules_based_reward_str}_{av_rewards_str}_{str(self.base_timesteps + self.num_timesteps)}_.zip")
-          copyfile(source_file, target_file)
+          # the generation is only added to the manifest once its file is complete
+          publish_file(source_file, target_file)
+          get_zoo_index(self.env_name).add(os.path.basename(target_file))
+          self.update_ratings(os.path.basename(target_file), eval_results)
           target_file = os.path.join(self.model_dir,  f"best_model.zip")
-          copyfile(source_file, target_file)
+          publish_file(source_file, target_file)
 
         # if playing against a rules based agent, update the global best reward to the improved metric
         if self.opponent_type == 'rules':
@@ -79,4 +86,31 @@ class SelfPlayCallback(EvalCallback):
       if self.callback is not None: #if evaling against rules-based agent as well, reset this too
         self.callback.best_mean_reward = -np.inf
 
-    return True
\ No newline at end of file
+    return True
+
+
+  def eval_envs(self):
+    envs = [self.eval_env]
+    if self.callback is not None:
+      envs.append(self.callback.eval_env)
+    return envs
+
+  def start_recording(self):
+    for env in self.eval_envs():
+      env.set_attr('results', [])
+
+  def stop_recording(self):
+    results = []
+    for env in self.eval_envs():
+      for env_results in env.get_attr('results'):
+        results += env_results
+      env.set_attr('results', None)
+    return results
+
+  def update_ratings(self, name, eval_results):
+    # the evaluation games from every rank, with the new generation in the agent's seat
+    games = []
+    for rank_results in eval_results:
+      for names, rewards in rank_results:
+        games.append(([name if n is None else n for n in names], rewards))
+    Ratings(self.env_name).update(games)
@@ -0,0 +1,58 @@
+import numpy as np
+
+from utils.runtime import NumpyPolicy
+
+BN_EPSILON = 1e-3 # Keras BatchNormalization default
+EXPORT_TOLERANCE = 1e-4 # float32 rounding differences between TensorFlow and NumPy
+
+
+def get_layers(params):
+    # group the live policy's parameters ('model/<layer>/<param>:0') by layer, in creation order
+    layers = []
+    for name, value in params.items():
+        if not name.startswith('model/'):
+            continue
+        layer, param = name[len('model/'):].rsplit('/', 1)
+        if len(layers) == 0 or layers[-1][0] != layer:
+            layers.append((layer, {}))
+        layers[-1][1][param.split(':')[0]] = value
+    return [p for _, p in layers]
+
+
+def fold_batch_norm(layers):
+    # each batch normalisation layer directly follows the dense / conv layer it normalises
+    folded = []
+    for p in layers:
+        if 'gamma' in p:
+            w, b = folded[-1]
+            mean = p.get('moving_mean', 0)
+            var = p.get('moving_variance', 1)
+            scale = p['gamma'] / np.sqrt(var + BN_EPSILON)
+            folded[-1] = (w * scale, (b - mean) * scale + p['beta'])
+        else:
+            folded.append((p['kernel'], p['bias']))
+    return folded
+
+
+def export_params(params, observation_space, env_name, path):
+    layers = fold_batch_norm(get_layers(params))
+
+    out = {
+        'env_name': env_name,
+        'low': np.asarray(observation_space.low, dtype=np.float32),
+        'high': np.asarray(observation_space.high, dtype=np.float32),
+        'n_layers': len(layers),
+        'compact': observation_space.dtype == np.uint8,
+    }
+    for i, (w, b) in enumerate(layers):
+        out[f'w{i}'] = w.astype(np.float32)
+        out[f'b{i}'] = b.astype(np.float32)
+
+    np.savez(path, **out)
+
+
+def export_differences(model, path, observations):
+    # largest gaps in action probabilities and values between the live policy and the exported one at path
+    probs, values = model.policy_pi.proba_value_step(observations)
+    numpy_probs, numpy_values = NumpyPolicy(path).proba_value_step(observations)
+    return np.abs(probs - numpy_probs).max(), np.abs(values - numpy_values).max()
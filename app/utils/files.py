@@ -4,25 +4,25 @@ import os
 import sys
 import random
 import csv
-import time
 import numpy as np
 
 from mpi4py import MPI
 
-from shutil import rmtree
+from shutil import rmtree, copyfile
 from stable_baselines.ppo1 import PPO1
 from stable_baselines.common.policies import MlpPolicy
 
 from utils.register import get_network_arch
+from utils.zoo import get_zoo_index
 
 import config
 
 from stable_baselines import logger
 
 
-def write_results(players, game, games, episode_length):
+def get_results_row(players, game, games, episode_length):
     
-    out = {'game': game
+    return {'game': game
     , 'games': games
     , 'episode_length': episode_length
     , 'p1': players[0].name
@@ -31,76 +31,77 @@ def write_results(players, game, games, episode_length):
     , 'p2_points': np.sum([x.points for x in players[1:]])
     }
 
+
+def write_results_rows(rows):
+
+    if len(rows) == 0:
+        return
+
     if not os.path.exists(config.RESULTSPATH):
         with open(config.RESULTSPATH,'a') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=out.keys())
+            writer = csv.DictWriter(csvfile, fieldnames=rows[0].keys())
             writer.writeheader()
 
     with open(config.RESULTSPATH,'a') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=out.keys())
-        writer.writerow(out)
+        writer = csv.DictWriter(csvfile, fieldnames=rows[0].keys())
+        writer.writerows(rows)
+
 
+def write_results(players, game, games, episode_length):
+    write_results_rows([get_results_row(players, game, games, episode_length)])
 
-def load_model(env, name):
+
+def publish_file(source, target):
+    # copied to a temporary name, flushed to disk and renamed, so other ranks never see a partial zip
+    tmp_target = f'{target}.{os.getpid()}.tmp'
+    copyfile(source, tmp_target)
+    with open(tmp_target, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_target, target)
+
+
+def save_model(model, target):
+    tmp_target = f'{target}.{os.getpid()}.tmp'
+    with open(tmp_target, 'wb') as f:
+        model.save(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_target, target)
+
+
+def create_base_model(env):
+    ppo_model = PPO1(get_network_arch(env.name), env=env)
+    logger.info(f'Saving base.zip PPO model...')
+    try:
+        save_model(ppo_model, os.path.join(config.MODELDIR, env.name, 'base.zip'))
+    except IOError as e:
+        sys.exit(f'Permissions not granted on zoo/{env.name}/...')
+    return ppo_model
+
+
+def load_model(env, name, attach_env = True):
 
     filename = os.path.join(config.MODELDIR, env.name, name)
     if os.path.exists(filename):
+        # files in the zoo are only ever renamed into place once complete, so this never needs to retry
         logger.info(f'Loading {name}')
-        cont = True
-        while cont:
-            try:
-                ppo_model = PPO1.load(filename, env=env)
-                cont = False
-            except Exception as e:
-                time.sleep(5)
-                print(e)
-    
-    elif name == 'base.zip':
-        cont = True
-        while cont:
-            try:
-                
-                rank = MPI.COMM_WORLD.Get_rank()
-                if rank == 0:
-                    ppo_model = PPO1(get_network_arch(env.name), env=env)
-                    logger.info(f'Saving base.zip PPO model...')
-                    ppo_model.save(os.path.join(config.MODELDIR, env.name, 'base.zip'))
-                else:
-
-                    ppo_model = PPO1.load(os.path.join(config.MODELDIR, env.name, 'base.zip'), env=env)
-
-                cont = False
-            except IOError as e:
-                sys.exit(f'Permissions not granted on zoo/{env.name}/...')
-            except Exception as e:
-                print('Waiting for base.zip to be created...')
-                time.sleep(2)
-                
+        ppo_model = PPO1.load(filename, env=env if attach_env else None)
+
+    elif name == 'base.zip' and MPI.COMM_WORLD.Get_rank() == 0:
+        ppo_model = create_base_model(env)
+
     else:
         raise Exception(f'\n{filename} not found')
     
     return ppo_model
 
 
-def load_all_models(env):
-    modellist = [f for f in os.listdir(os.path.join(config.MODELDIR, env.name)) if f.startswith("_model")]
-    modellist.sort()
-    models = [load_model(env, 'base.zip')]
-    for model_name in modellist:
-        models.append(load_model(env, name = model_name))
-    return models
+def get_model_names(env_name):
+    return get_zoo_index(env_name).model_names()
 
 
 def get_best_model_name(env_name):
-    modellist = [f for f in os.listdir(os.path.join(config.MODELDIR, env_name)) if f.startswith("_model")]
-    
-    if len(modellist)==0:
-        filename = None
-    else:
-        modellist.sort()
-        filename = modellist[-1]
-        
-    return filename
+    return get_zoo_index(env_name).best_model_name()
 
 def get_model_stats(filename):
     if filename is None:
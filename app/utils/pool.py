@@ -0,0 +1,196 @@
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+from stable_baselines.ppo1 import PPO1
+
+from utils.files import load_model, get_model_names
+
+import config
+
+from stable_baselines import logger
+
+
+class BackgroundLoader():
+    # generations are loaded on a background thread and only published once ready,
+    # so games keep using the models already available rather than waiting on the load
+    def start_loader(self):
+        self.lock = threading.Condition()
+        self.loading = set()
+        self.substitutions = 0
+        # a single loader thread, with at most MAX_QUEUED_LOADS generations waiting for it
+        self.queue = queue.Queue(config.MAX_QUEUED_LOADS)
+        threading.Thread(target = self.loader, daemon = True).start()
+
+    def append(self, name):
+        with self.lock:
+            if name in self.names:
+                return
+        self.load_in_background(name)
+
+    def load_in_background(self, name):
+        with self.lock:
+            if name in self.loading:
+                return
+            try:
+                self.queue.put_nowait(name)
+            except queue.Full:
+                # dropped for now, it is requested again the next time it is missed
+                return
+            self.loading.add(name)
+
+    def loader(self):
+        while True:
+            self.background_load(self.queue.get())
+
+    def background_load(self, name):
+        try:
+            loaded = self.load(name)
+        except Exception as e:
+            logger.warn(f'Failed to load {name} in the background: {e}')
+            loaded = None
+
+        with self.lock:
+            if loaded is not None:
+                if name not in self.names:
+                    self.names.append(name)
+                self.publish(name, loaded)
+                logger.debug(f'{name} is now available as an opponent')
+            self.loading.discard(name)
+            self.lock.notify_all()
+
+    def get_loaded(self, name):
+        # waits for a background load of name rather than loading it a second time
+        # must be called holding the lock
+        self.lock.wait_for(lambda: name not in self.loading)
+        if not self.is_loaded(name):
+            self.publish(name, self.load(name))
+
+    def available(self, i):
+        # the name and model of i if it is loaded, otherwise of the newest generation (always loaded)
+        # while i is loaded in the background
+        # the model is taken in the same lock hold as the check, so it can't be evicted in between
+        with self.lock:
+            name = self.names[i]
+            if not self.is_loaded(name):
+                self.load_in_background(name)
+                self.substitutions += 1
+                logger.debug(f'{name} is not loaded yet, {self.names[-1]} is playing in its place')
+                name = self.names[-1]
+            return name, self.loaded_model(name)
+
+
+class OpponentPool(BackgroundLoader):
+    # list-like bank of opponent models that holds every file name but only loads a model
+    # when it is first requested, evicting the least recently used beyond max_models
+    def __init__(self, env, max_models = config.MAX_LOADED_OPPONENTS):
+        self.env = env
+        self.max_models = max_models
+        self.names = ['base.zip'] + get_model_names(env.name)
+        self.models = OrderedDict()
+        self.start_loader()
+        self[0] # loads (or creates) base.zip up front
+        self[-1] # and the newest generation, which stands in for any that aren't loaded yet
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        with self.lock:
+            name = self.names[i]
+            self.get_loaded(name)
+            return self.loaded_model(name)
+
+    def loaded_model(self, name):
+        # must be called holding the lock
+        self.models.move_to_end(name)
+        return self.models[name]
+
+    def load(self, name):
+        # opponents only need the policy, so they aren't attached to the env, which may be stepping on another thread
+        return load_model(self.env, name, attach_env = False)
+
+    def is_loaded(self, name):
+        return name in self.models
+
+    def publish(self, name, model):
+        self.models[name] = model
+        self.models.move_to_end(name)
+        # base.zip and the newest generation are never evicted, so there is always a loaded stand-in
+        stale = [n for n in self.models if n not in (name, self.names[0], self.names[-1])]
+        for evicted in stale[:len(self.models) - self.max_models]:
+            logger.debug(f'Evicting {evicted} from the opponent pool')
+            self.models.pop(evicted).sess.close()
+
+
+class ZooModel():
+    # stands in for one generation's PPO model, swapping its weights into the zoo graph before use
+    def __init__(self, zoo, name):
+        self.zoo = zoo
+        self.name = name
+
+    @property
+    def policy_pi(self):
+        return self.zoo.activate(self.name).policy_pi
+
+    def action_probability(self, observation):
+        return self.zoo.activate(self.name).action_probability(observation)
+
+
+class OpponentZoo(BackgroundLoader):
+    # list-like bank of opponent models that share one policy graph per process
+    # each generation is held as its parameter arrays and loaded into the graph when it is used
+    def __init__(self, env):
+        self.env = env
+        self.names = ['base.zip'] + get_model_names(env.name)
+        self.model = load_model(env, 'base.zip')
+        self.params = {'base.zip': self.model.get_parameters()}
+        self.zoo_models = {}
+        self.active = 'base.zip'
+        self.start_loader()
+        self.get_params(self.names[-1]) # the newest generation stands in for any that aren't loaded yet
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        with self.lock:
+            return self.loaded_model(self.names[i])
+
+    def loaded_model(self, name):
+        # must be called holding the lock
+        if name not in self.zoo_models:
+            self.zoo_models[name] = ZooModel(self, name)
+        return self.zoo_models[name]
+
+    def load(self, name):
+        logger.info(f'Loading {name} parameters')
+        _, params = PPO1._load_from_file(os.path.join(config.MODELDIR, self.env.name, name))
+        return params
+
+    def is_loaded(self, name):
+        return name in self.params
+
+    def publish(self, name, params):
+        self.params[name] = params
+
+    def get_params(self, name):
+        with self.lock:
+            self.get_loaded(name)
+            return self.params[name]
+
+    def activate(self, name):
+        if self.active != name:
+            self.model.load_parameters(self.get_params(name))
+            self.active = name
+        return self.model
+
+
+zoos = {}
+
+def get_opponent_zoo(env):
+    # one zoo (and so one graph) per environment per process, shared by every selfplay env
+    if env.name not in zoos:
+        zoos[env.name] = OpponentZoo(env)
+    return zoos[env.name]
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import numpy as np
+
+from utils.zoo import get_zoo_index
+
+import config
+
+
+def model_name(filename):
+    # models are rated under the name used on the command line, without .zip
+    if filename.endswith('.zip'):
+        return filename[:-len('.zip')]
+    return filename
+
+
+def expected_score(rating, opponent_rating):
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def game_deltas(names, rewards, ratings):
+    # Elo change for each model in one game, treating every pair of seats as a match
+    # a model filling several seats gets the average over its seats
+    deltas = {}
+    seats = {}
+    for i, name in enumerate(names):
+        delta = 0
+        opponents = 0
+        for j, opponent in enumerate(names):
+            if opponent == name:
+                continue
+            score = 1.0 if rewards[i] > rewards[j] else 0.5 if rewards[i] == rewards[j] else 0.0
+            delta += score - expected_score(ratings.get(name, config.INITIAL_RATING), ratings.get(opponent, config.INITIAL_RATING))
+            opponents += 1
+        deltas[name] = deltas.get(name, 0) + config.RATING_K * delta / opponents
+        seats[name] = seats.get(name, 0) + 1
+
+    return {name: deltas[name] / seats[name] for name in deltas}
+
+
+class Ratings():
+    # Elo rating for every model in zoo/<env>, kept in a SQLite file next to the models
+    def __init__(self, env_name):
+        self.path = os.path.join(config.MODELDIR, env_name, 'ratings.db')
+        self.connection = sqlite3.connect(self.path, timeout = 60, isolation_level = None)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS ratings (name TEXT PRIMARY KEY, rating REAL NOT NULL, games INTEGER NOT NULL)')
+        self.env_name = env_name
+        self.data_version = None
+        self.ratings = {}
+        self.probs = {}
+
+    def all(self):
+        # data_version changes whenever another connection commits, so the table is only re-read after a write
+        data_version = self.connection.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self.data_version:
+            self.ratings = dict(self.connection.execute('SELECT name, rating FROM ratings'))
+            self.probs = {}
+            self.data_version = data_version
+        return self.ratings
+
+    def get(self, name):
+        return self.all().get(model_name(name), config.INITIAL_RATING)
+
+    def update(self, games):
+        # games is a list of (names, rewards), one entry per seat, applied in order in a single transaction
+        # best_model is a copy of the newest generation, so its games count towards that generation
+        best_model_name = get_zoo_index(self.env_name).best_model_name()
+        aliases = {} if best_model_name is None else {'best_model': model_name(best_model_name)}
+
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            ratings = {}
+            played = {}
+            for name, rating, n_games in self.connection.execute('SELECT name, rating, games FROM ratings'):
+                ratings[name] = rating
+                played[name] = n_games
+
+            changed = set()
+            for names, rewards in games:
+                names = [aliases.get(model_name(name), model_name(name)) for name in names]
+                if len(set(names)) < 2:
+                    continue
+                for name, delta in game_deltas(names, rewards, ratings).items():
+                    ratings[name] = ratings.get(name, config.INITIAL_RATING) + delta
+                    played[name] = played.get(name, 0) + 1
+                    changed.add(name)
+
+            self.connection.executemany('INSERT OR REPLACE INTO ratings (name, rating, games) VALUES (?, ?, ?)'
+                , [(name, ratings[name], played[name]) for name in changed])
+            self.connection.execute('COMMIT')
+        except Exception:
+            self.connection.execute('ROLLBACK')
+            raise
+        # data_version doesn't change for this connection's own commits
+        self.data_version = None
+
+    def sample(self, names):
+        # picks the index of an opponent, favouring higher rated models
+        # names only ever grow by appending, so the probabilities are cached by length until the ratings change
+        ratings = self.all()
+        key = len(names)
+        if key not in self.probs:
+            r = np.array([ratings.get(model_name(name), config.INITIAL_RATING) for name in names])
+            p = np.exp((r - r.max()) / config.RATING_TEMPERATURE)
+            self.probs[key] = p / p.sum()
+        return np.random.choice(len(names), p = self.probs[key])
@@ -1,4 +1,7 @@
 
+ENVIRONMENTS = ['tictactoe', 'connect4', 'sushigo', 'butterfly']
+COMPACT_ENVIRONMENTS = ['sushigo', 'butterfly']
+
 
 def get_environment(env_name):
     try:
@@ -40,3 +43,21 @@ def get_network_arch(env_name):
     else:
         raise Exception(f'No model architectures found for {env_name}')
 
+
+def get_env_kwargs(env_name, compact):
+    if not compact:
+        return {}
+    if env_name not in COMPACT_ENVIRONMENTS:
+        raise Exception(f'{env_name} has no compact observation mode - --compact only works for {", ".join(COMPACT_ENVIRONMENTS)}')
+    return {'compact': True}
+
+
+def get_compact_layout(env_name):
+    # where the scores sit in the env's compact observation, and how they are stored
+    if env_name in ('sushigo'):
+        from sushigo.envs import sushigo as env_module
+    elif env_name in ('butterfly'):
+        from butterfly.envs import butterfly as env_module
+    else:
+        raise Exception(f'{env_name} has no compact observation mode')
+    return env_module.SCORES_START, env_module.PLAYERS, env_module.MAX_SCORE, env_module.SCORE_OFFSET
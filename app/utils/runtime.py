@@ -0,0 +1,136 @@
+import os
+import numpy as np
+
+from utils.register import get_compact_layout
+
+import config
+
+
+# layer counts for each environment's CustomPolicy in models/<env>/models.py
+ARCHITECTURES = {
+    'tictactoe': {'type': 'cnn', 'residuals': 1, 'value_hidden': 0},
+    'connect4': {'type': 'cnn', 'residuals': 3, 'value_hidden': 1},
+    'sushigo': {'type': 'mlp', 'residuals': 1, 'policy_hidden': 1, 'value_hidden': 1, 'actions': 156},
+    'butterfly': {'type': 'mlp', 'residuals': 5, 'policy_hidden': 1, 'value_hidden': 1, 'actions': 200},
+}
+
+
+def relu(x):
+    return np.maximum(x, 0)
+
+
+def softmax(x):
+    e = np.exp(x - np.max(x, axis = -1, keepdims = True))
+    return e / np.sum(e, axis = -1, keepdims = True)
+
+
+def conv2d(x, w, b):
+    # stride 1, 'same' padding as in Keras, which puts the extra row / column of an even kernel after
+    k = w.shape[0]
+    before = (k - 1) // 2
+    after = k - 1 - before
+    n, h, wd, c = x.shape
+    padded = np.pad(x, ((0, 0), (before, after), (before, after), (0, 0)))
+    patches = np.concatenate([padded[:, i:i+h, j:j+wd, :] for i in range(k) for j in range(k)], axis = -1)
+    return patches.reshape(n * h * wd, k * k * c).dot(w.reshape(k * k * c, -1)).reshape(n, h, wd, -1) + b
+
+
+class NumpyPolicy():
+    # forward pass of an exported CustomPolicy, with batch normalisation already folded into the weights
+    def __init__(self, path):
+        f = np.load(path)
+        self.arch = ARCHITECTURES[str(f['env_name'])]
+        self.low = f['low']
+        self.high = f['high']
+        self.scale = np.all(np.isfinite(self.low)) and np.all(np.isfinite(self.high)) and np.any(self.high - self.low != 0)
+        self.layers = [(f[f'w{i}'], f[f'b{i}']) for i in range(int(f['n_layers']))]
+        self.compact = 'compact' in f and bool(f['compact'])
+        if self.compact:
+            self.scores_start, self.players, self.max_score, self.score_offset = get_compact_layout(str(f['env_name']))
+
+    def unpack(self, obs):
+        # same expansion of a compact observation as unpack_observation in the env's models.py
+        n_bytes = obs.shape[1] - self.players
+        bits = np.unpackbits(obs[:, :n_bytes], axis = 1)[:, :self.scores_start + self.arch['actions']].astype(np.float32)
+        scores = (obs[:, n_bytes:].astype(np.float32) - self.score_offset) / self.max_score
+        return np.concatenate([bits[:, :self.scores_start], scores, bits[:, self.scores_start:]], axis = 1)
+
+    def preprocess(self, obs):
+        if self.compact:
+            return self.unpack(np.asarray(obs, dtype = np.uint8))
+        obs = np.asarray(obs, dtype = np.float32)
+        if self.scale:
+            obs = (obs - self.low) / (self.high - self.low)
+        return obs
+
+    def forward(self, obs):
+        layers = iter(self.layers)
+        y = self.preprocess(obs)
+
+        if self.arch['type'] == 'cnn':
+            y = relu(conv2d(y, *next(layers)))
+            for _ in range(self.arch['residuals']):
+                shortcut = y
+                y = relu(conv2d(y, *next(layers)))
+                y = relu(shortcut + conv2d(y, *next(layers)))
+            features = y
+
+            y = relu(conv2d(features, *next(layers))).reshape(len(features), -1)
+            w, b = next(layers)
+            logits = y.dot(w) + b
+
+            y = relu(conv2d(features, *next(layers))).reshape(len(features), -1)
+
+        else:
+            y, legal_actions = y[:, :-self.arch['actions']], y[:, -self.arch['actions']:]
+            w, b = next(layers)
+            y = relu(y.dot(w) + b)
+            for _ in range(self.arch['residuals']):
+                shortcut = y
+                w, b = next(layers)
+                y = relu(y.dot(w) + b)
+                w, b = next(layers)
+                y = relu(shortcut + y.dot(w) + b)
+            features = y
+
+            y = features
+            for _ in range(self.arch['policy_hidden']):
+                w, b = next(layers)
+                y = relu(y.dot(w) + b)
+            w, b = next(layers)
+            logits = y.dot(w) + b + (1 - legal_actions) * -1e8
+
+            y = features
+
+        for _ in range(self.arch['value_hidden']):
+            w, b = next(layers)
+            y = relu(y.dot(w) + b)
+        w, b = next(layers)
+        value = np.tanh(y.dot(w) + b)[:, 0]
+
+        return softmax(logits), value
+
+    def proba_step(self, obs, state=None, mask=None):
+        return self.forward(obs)[0]
+
+    def value(self, obs, state=None, mask=None):
+        return self.forward(obs)[1]
+
+    def proba_value_step(self, obs, state=None, mask=None):
+        return self.forward(obs)
+
+
+class NumpyModel():
+    # drop-in for a loaded PPO model wherever an Agent only needs action probabilities and values
+    def __init__(self, path):
+        self.policy_pi = NumpyPolicy(path)
+
+    def action_probability(self, observation):
+        observation = np.asarray(observation)
+        if observation.shape == self.policy_pi.low.shape:
+            return self.policy_pi.proba_step(observation[None])[0]
+        return self.policy_pi.proba_step(observation)
+
+
+def load_numpy_model(env, name):
+    return NumpyModel(os.path.join(config.MODELDIR, env.name, name))
@@ -2,7 +2,9 @@ import os
 import numpy as np
 import random
 
-from utils.files import load_model, load_all_models, get_best_model_name
+from utils.files import get_best_model_name
+from utils.pool import OpponentPool, get_opponent_zoo
+from utils.ratings import Ratings, model_name
 from utils.agents import Agent
 
 import config
@@ -12,43 +14,61 @@ from stable_baselines import logger
 def selfplay_wrapper(env):
     class SelfPlayEnv(env):
         # wrapper over the normal single player env, but loads the best self play model
-        def __init__(self, opponent_type, verbose):
-            super(SelfPlayEnv, self).__init__(verbose)
+        def __init__(self, opponent_type, verbose, opponent_models = None, shared_graph = False, **kwargs):
+            super(SelfPlayEnv, self).__init__(verbose, **kwargs)
             self.opponent_type = opponent_type
-            self.opponent_models = load_all_models(self)
-            self.best_model_name = get_best_model_name(self.name)
+            if opponent_models is None:
+                if shared_graph:
+                    opponent_models = get_opponent_zoo(self)
+                else:
+                    opponent_models = OpponentPool(self)
+            self.opponent_models = opponent_models
+            if self.opponent_type == 'rated':
+                self.ratings = Ratings(self.name)
+            # (names, rewards) for each finished game, while an evaluation is recording them
+            self.results = None
+
+        def load_new_models(self):
+            # incremental load of new model, in the background until it joins opponent_models.names
+            # a load that failed is started again on the next reset
+            best_model_name = get_best_model_name(self.name)
+            if best_model_name is not None and best_model_name != self.opponent_models.names[-1]:
+                self.opponent_models.append(best_model_name)
 
         def setup_opponents(self):
             if self.opponent_type == 'rules':
                 self.opponent_agent = Agent('rules')
+                self.opponent_name = 'rules'
             else:
-                # incremental load of new model
-                best_model_name = get_best_model_name(self.name)
-                if self.best_model_name != best_model_name:
-                    self.opponent_models.append(load_model(self, best_model_name ))
-                    self.best_model_name = best_model_name
+                self.load_new_models()
 
                 if self.opponent_type == 'random':
                     start = 0
                     end = len(self.opponent_models) - 1
                     i = random.randint(start, end)
-                    self.opponent_agent = Agent('ppo_opponent', self.opponent_models[i]) 
 
                 elif self.opponent_type == 'best':
-                    self.opponent_agent = Agent('ppo_opponent', self.opponent_models[-1])  
+                    i = len(self.opponent_models) - 1
 
                 elif self.opponent_type == 'mostly_best':
                     j = random.uniform(0,1)
                     if j < 0.8:
-                        self.opponent_agent = Agent('ppo_opponent', self.opponent_models[-1])  
+                        i = len(self.opponent_models) - 1
                     else:
                         start = 0
                         end = len(self.opponent_models) - 1
                         i = random.randint(start, end)
-                        self.opponent_agent = Agent('ppo_opponent', self.opponent_models[i])  
+
+                elif self.opponent_type == 'rated':
+                    i = self.ratings.sample(self.opponent_models.names)
 
                 elif self.opponent_type == 'base':
-                    self.opponent_agent = Agent('base', self.opponent_models[0])  
+                    i = 0
+
+                # an evicted generation is reloaded in the background, with the newest one playing in its place meanwhile
+                name, model = self.opponent_models.available(i)
+                self.opponent_agent = Agent('base' if self.opponent_type == 'base' else 'ppo_opponent', model)
+                self.opponent_name = model_name(name)
 
             self.agent_player_num = np.random.choice(self.n_players)
             self.agents = [self.opponent_agent] * self.n_players
@@ -60,10 +80,13 @@ def selfplay_wrapper(env):
                 pass
 
 
-        def reset(self):
+        def new_game(self):
             super(SelfPlayEnv, self).reset()
             self.setup_opponents()
 
+        def reset(self):
+            self.new_game()
+
             if self.current_player_num != self.agent_player_num:   
                 self.continue_game()
 
@@ -73,25 +96,40 @@ def selfplay_wrapper(env):
         def current_agent(self):
             return self.agents[self.current_player_num]
 
+        def opponent_step(self, action):
+            observation, reward, done, _ = super(SelfPlayEnv, self).step(action)
+            logger.debug(f'Rewards: {reward}')
+            logger.debug(f'Done: {done}')
+            return observation, reward, done, None
+
         def continue_game(self):
             while self.current_player_num != self.agent_player_num:
                 self.render()
                 action = self.current_agent.choose_action(self, choose_best_action = False, mask_invalid_actions = False)
-                observation, reward, done, _ = super(SelfPlayEnv, self).step(action)
-                logger.debug(f'Rewards: {reward}')
-                logger.debug(f'Done: {done}')
+                observation, reward, done, _ = self.opponent_step(action)
                 if done:
                     break
 
             return observation, reward, done, None
 
 
-        def step(self, action):
+        def agent_step(self, action):
             self.render()
             observation, reward, done, _ = super(SelfPlayEnv, self).step(action)
             logger.debug(f'Action played by agent: {action}')
             logger.debug(f'Rewards: {reward}')
             logger.debug(f'Done: {done}')
+            return observation, reward, done, None
+
+        def record_result(self, reward):
+            # the agent being trained has no name yet, so its seat is None
+            if self.results is not None:
+                names = [self.opponent_name] * self.n_players
+                names[self.agent_player_num] = None
+                self.results.append((names, list(reward)))
+
+        def step(self, action):
+            observation, reward, done, _ = self.agent_step(action)
 
             if not done:
                 observation, reward, done, _ = self.continue_game()
@@ -101,7 +139,85 @@ def selfplay_wrapper(env):
 
             if done:
                 self.render()
+                self.record_result(reward)
 
             return observation, agent_reward, done, {} 
 
-    return SelfPlayEnv
\ No newline at end of file
+    return SelfPlayEnv
+
+
+class SelfPlayVecEnv():
+    # runs n_envs selfplay games side by side, sharing one set of opponent models
+    # opponent moves that use the same model are evaluated together in a single batch
+    def __init__(self, env, n_envs, opponent_type, verbose, shared_graph = False, **kwargs):
+        SelfPlayEnv = selfplay_wrapper(env)
+        self.envs = [SelfPlayEnv(opponent_type, verbose, shared_graph = shared_graph, **kwargs)]
+        for _ in range(n_envs - 1):
+            self.envs.append(SelfPlayEnv(opponent_type, verbose, opponent_models = self.envs[0].opponent_models, **kwargs))
+
+        self.n_envs = n_envs
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+
+    def continue_games(self, env_nums):
+        results = {}
+        waiting = [i for i in env_nums if self.envs[i].current_player_num != self.envs[i].agent_player_num]
+
+        while len(waiting) > 0:
+            groups = {}
+            for i in waiting:
+                agent = self.envs[i].current_agent
+                key = id(agent) if agent.model is None else id(agent.model)
+                groups.setdefault(key, (agent, []))[1].append(i)
+
+            for agent, group in groups.values():
+                envs = [self.envs[i] for i in group]
+                for env in envs:
+                    env.render()
+
+                actions = agent.choose_actions(envs, choose_best_action = False, mask_invalid_actions = False)
+
+                for i, env, action in zip(group, envs, actions):
+                    _, reward, done, _ = env.opponent_step(action)
+                    results[i] = (reward, done)
+
+            waiting = [i for i in waiting if not results[i][1] and self.envs[i].current_player_num != self.envs[i].agent_player_num]
+
+        return results
+
+    def start_games(self, env_nums):
+        # each new_game checks for a new model, which the shared opponent_models only loads once
+        for i in env_nums:
+            self.envs[i].new_game()
+        self.continue_games(env_nums)
+
+    def reset(self):
+        self.start_games(range(self.n_envs))
+        return np.array([env.observation for env in self.envs])
+
+    def step(self, actions):
+        rewards = [None] * self.n_envs
+        dones = [False] * self.n_envs
+        infos = [{} for _ in range(self.n_envs)]
+
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            _, rewards[i], dones[i], _ = env.agent_step(action)
+
+        results = self.continue_games([i for i in range(self.n_envs) if not dones[i]])
+        for i, (reward, done) in results.items():
+            rewards[i] = reward
+            dones[i] = done
+
+        agent_rewards = [reward[env.agent_player_num] for reward, env in zip(rewards, self.envs)]
+
+        finished = [i for i in range(self.n_envs) if dones[i]]
+        for i in finished:
+            self.envs[i].render()
+            self.envs[i].record_result(rewards[i])
+            infos[i]['terminal_observation'] = np.array(self.envs[i].observation)
+
+        if len(finished) > 0:
+            self.start_games(finished)
+
+        observations = np.array([env.observation for env in self.envs])
+        return observations, np.array(agent_rewards), np.array(dones), infos
@@ -0,0 +1,90 @@
+import os
+import json
+
+import config
+
+
+MANIFEST = 'manifest.json'
+
+
+def manifest_entry(filename):
+    # _model_{generation}_{rules based reward}_{reward}_{timesteps}_.zip
+    stats = filename.split('_')
+    return {'name': filename
+    , 'generation': int(stats[2])
+    , 'rules_reward': float(stats[3])
+    , 'reward': float(stats[4])
+    , 'timesteps': int(stats[5])
+    , 'path': filename
+    }
+
+
+class ZooIndex():
+    # in-memory copy of zoo/<env>/manifest.json, the list of every generation in the zoo
+    # the manifest is only re-read when its file changes, so lookups don't touch the directory
+    def __init__(self, env_name):
+        self.model_dir = os.path.join(config.MODELDIR, env_name)
+        self.path = os.path.join(self.model_dir, MANIFEST)
+        self.stamp = None
+        self.version = 0
+        self.models = []
+
+    def scan(self):
+        names = sorted(f for f in os.listdir(self.model_dir) if f.startswith('_model') and f.endswith('.zip'))
+        return [manifest_entry(name) for name in names]
+
+    def save(self):
+        # written to a temporary file and renamed, so readers never see a partial manifest
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': self.version, 'models': self.models}, f, indent = 2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.stamp = self.get_stamp()
+
+    def get_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+    def refresh(self):
+        stamp = self.get_stamp()
+        if stamp is None:
+            # no manifest yet (or the zoo was reset), so build one from the directory
+            self.version += 1
+            self.models = self.scan()
+            self.save()
+        elif stamp != self.stamp:
+            with open(self.path) as f:
+                manifest = json.load(f)
+            self.version = manifest['version']
+            self.models = manifest['models']
+            self.stamp = stamp
+        return self
+
+    def add(self, filename):
+        self.refresh()
+        if filename not in self.model_names():
+            self.models = sorted(self.models + [manifest_entry(filename)], key = lambda m: m['name'])
+            self.version += 1
+            self.save()
+
+    def model_names(self):
+        return [m['name'] for m in self.models]
+
+    def best_model_name(self):
+        if len(self.models) == 0:
+            return None
+        return self.models[-1]['name']
+
+
+indexes = {}
+
+def get_zoo_index(env_name):
+    # one index per environment per process, checked against the manifest on every use
+    if env_name not in indexes:
+        indexes[env_name] = ZooIndex(env_name)
+    return indexes[env_name].refresh()